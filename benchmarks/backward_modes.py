@@ -0,0 +1,58 @@
+"""Compares graph (closure) and tape backward on the nn-clf Iris workload.
+
+Run from the repository root:
+    python -m benchmarks.backward_modes --steps 500
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import PYTHON_BACKENDS, load_backend, load_iris
+from lib.gd_data_loaders import MiniBatchDataLoader
+from lib.metrics.losses import negative_log_likelihood
+from lib.optimizers import SgdOptimizer
+
+def run(backend, use_tape, steps):
+    modules = load_backend(backend)
+    Value, Matrix, nn, processing = modules.value.Value, modules.linear_algebra.Matrix, modules.nn, modules.processing
+
+    random.seed(0)
+    np.random.seed(0)
+    data, labels = load_iris()
+    ohe = processing.OneHotEncoder()
+    ohe.fit(labels)
+    normalizer = processing.ColumnNormalizer()
+    X = Matrix(data)
+    normalizer.fit(X)
+    data_loader = MiniBatchDataLoader(normalizer.transform(X), ohe.transform(labels), 4)
+    model = nn.NN([nn.Linear(4, 3), nn.Softmax()])
+    optimizer = SgdOptimizer(model, 0.01)
+
+    Value.use_tape(use_tape)
+    try:
+        time_point = time.perf_counter()
+        for _ in range(steps):
+            X_b, y_b = data_loader.get_batch()
+            loss = negative_log_likelihood(y_b, model(X_b))
+            optimizer.step(loss)
+        return time.perf_counter() - time_point, float(loss.data)
+    finally:
+        Value.use_tape(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--backends", nargs="+", default=PYTHON_BACKENDS, choices=PYTHON_BACKENDS)
+    args = parser.parse_args()
+
+    for backend in args.backends:
+        for mode, use_tape in [("graph", False), ("tape", True)]:
+            elapsed_time, loss = run(backend, use_tape, args.steps)
+            print(f"{backend:<17} {mode:<6} {args.steps} steps | {elapsed_time:.3f}s | {1000 * elapsed_time / args.steps:.3f}ms/step | last loss {loss:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import importlib
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+BACKENDS = ["original_backend", "np_backend", "pt_backend"]
+PYTHON_BACKENDS = ["original_backend", "np_backend"]
+
+
+def load_backend(backend):
+    modules = SimpleNamespace(
+        linear_algebra=importlib.import_module(f"lib.{backend}.linear_algebra"),
+        nn=importlib.import_module(f"lib.{backend}.nn"),
+        processing=importlib.import_module(f"lib.{backend}.processing"),
+        optimizers=importlib.import_module("lib.pt_backend.optimizers" if backend == "pt_backend" else "lib.optimizers"),
+    )
+    if backend in PYTHON_BACKENDS:
+        modules.value = importlib.import_module(f"lib.{backend}.value")
+    return modules
+
+
+def load_iris():
+    data, labels = [], []
+    with open("data/iris.data", "rt") as f:
+        for line in f.readlines():
+            data.append([float(v) for v in line.split(",")[:-1]])
+            labels.append(line.split(",")[-1])
+    return data, labels
+
+
+def load_boston():
+    data = []
+    with open("data/boston_house_prices.data", "rt") as f:
+        for line in f.readlines():
+            data.append([float(v) for v in line.split()])
+    return [row[:-1] for row in data], [row[-1:] for row in data]
+
+
+def load_flipkart():
+    docs = []
+    with open("data/flipkart_reviews.csv", "rt") as f:
+        for line in f.readlines()[1:]:
+            docs.append(line[:-12])
+    return docs
+
+
+def measure(func, repeat=5, setup=lambda: None):
+    """Times `func(setup())` `repeat` times, then measures the peak Python heap of one extra run.
+
+    Timing runs are done without tracemalloc so they are not slowed down by it; the state
+    returned by `setup` is rebuilt before every run and is excluded from the measurements.
+    """
+    func(setup())
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        time_point = time.perf_counter()
+        func(state)
+        timings.append(time.perf_counter() - time_point)
+
+    state = setup()
+    tracemalloc.start()
+    func(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "min_s": timings[0],
+        "median_s": timings[len(timings) // 2],
+        "peak_mb": peak / 2 ** 20,
+    }
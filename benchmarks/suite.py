@@ -0,0 +1,204 @@
+"""Microbenchmark suite for the backends, layers, optimizers, data loaders and tokenizer.
+
+Run from the repository root, e.g.:
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --groups matmul models --backends np_backend pt_backend --compare bench.json
+
+Every case reports min/median wall time over `--repeat` runs and the peak Python heap
+(tracemalloc) of a separate run. Results are written as JSON keyed by
+`group/backend/case`, so files from different commits can be compared with `--compare`.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+
+import numpy as np
+
+from benchmarks.common import BACKENDS, PYTHON_BACKENDS, load_backend, load_boston, load_flipkart, load_iris, measure
+from lib.gd_data_loaders import BatchDataLoader, MiniBatchDataLoader, StochasticDataLoader
+from lib.io import load_tokenizer
+from lib.metrics.losses import mean_squared_error, negative_log_likelihood
+from lib.tokenization import BPETokenizer
+
+GROUPS = ["values", "matmul", "models", "optimizers", "data_loaders", "tokenizer"]
+
+
+def backward(backend, loss):
+    if backend != "pt_backend":
+        loss.grad = 1
+    loss.backward()
+
+
+def iris_model(backend, batch_size):
+    m = load_backend(backend)
+    data, labels = load_iris()
+    ohe = m.processing.OneHotEncoder()
+    ohe.fit(labels)
+    X, y = m.linear_algebra.Matrix(data[:batch_size]), ohe.transform(labels[:batch_size])
+    model = m.nn.NN([m.nn.Linear(4, 3), m.nn.Softmax()])
+    return model, lambda: negative_log_likelihood(y, model(X))
+
+
+def boston_model(backend, batch_size):
+    m = load_backend(backend)
+    data, targets = load_boston()
+    X, y = m.linear_algebra.Matrix(data[:batch_size]), m.linear_algebra.Matrix(targets[:batch_size])
+    model = m.nn.NN([m.nn.Linear(13, 4), m.nn.LayerNorm(4), m.nn.ReLU(), m.nn.Linear(4, 1)])
+    return model, lambda: mean_squared_error(y, model(X))
+
+
+def values_cases(backend, args):
+    if backend not in PYTHON_BACKENDS:
+        return {}
+    Value = load_backend(backend).value.Value
+    data = np.random.normal(size=args.values).tolist()
+    values = [Value(v) for v in data]
+    return {
+        f"create_{args.values}": measure(lambda _: [Value(v) for v in data], args.repeat),
+        f"add_{args.values}": measure(lambda _: [v + v for v in values], args.repeat),
+    }
+
+
+def matmul_cases(backend, args):
+    Matrix = load_backend(backend).linear_algebra.Matrix
+    cases = {}
+    for size in args.matmul_sizes:
+        A = Matrix(np.random.normal(size=(size, size)).tolist())
+        B = Matrix(np.random.normal(size=(size, size)).tolist())
+        cases[f"matmul_{size}"] = measure(lambda _: A.matmul(B), args.repeat)
+    return cases
+
+
+def models_cases(backend, args):
+    cases = {}
+    for name, build_model, batch_size in [("iris", iris_model, 16), ("boston", boston_model, 32)]:
+        _, compute_loss = build_model(backend, batch_size)
+        cases[f"{name}_forward"] = measure(lambda _: compute_loss(), args.repeat)
+        cases[f"{name}_forward_backward"] = measure(lambda _: backward(backend, compute_loss()), args.repeat)
+    return cases
+
+
+def optimizers_cases(backend, args):
+    optimizers = load_backend(backend).optimizers
+    optimizer_creators = {
+        "sgd": lambda nn: optimizers.SgdOptimizer(nn, 0.01),
+        "sgd_momentum": lambda nn: optimizers.SgdWithMomentumOptimizer(nn, 0.01, 0.9),
+        "adagrad": lambda nn: optimizers.AdaGradOptimizer(nn, 0.01),
+        "rmsprop": lambda nn: optimizers.RmsPropOptimizer(nn, 0.01, 0.95),
+        "adam": lambda nn: optimizers.AdamOptimizer(nn, 0.01, 0.95, 0.95),
+    }
+    cases = {}
+    for name, optimizer_creator in optimizer_creators.items():
+        model, compute_loss = boston_model(backend, 32)
+        optimizer = optimizer_creator(model)
+        optimizer.step(compute_loss())
+        cases[f"{name}_update"] = measure(lambda _: optimizer._update_grads(), args.repeat)
+        cases[f"{name}_step"] = measure(lambda _: optimizer.step(compute_loss()), args.repeat)
+    return cases
+
+
+def data_loaders_cases(backend, args):
+    Matrix = load_backend(backend).linear_algebra.Matrix
+    data, targets = load_boston()
+    X, y = Matrix(data), Matrix(targets)
+    data_loaders = {
+        "batch": BatchDataLoader(X, y),
+        "stochastic": StochasticDataLoader(X, y),
+        "mini_batch_32": MiniBatchDataLoader(X, y, 32),
+    }
+    return {
+        f"{name}_get_batch_x{args.batches}": measure(lambda _: [data_loader.get_batch() for _ in range(args.batches)], args.repeat)
+        for name, data_loader in data_loaders.items()
+    }
+
+
+def tokenizer_cases(args):
+    docs = load_flipkart()[:args.tokenizer_docs]
+    return {
+        f"fit_{args.tokenizer_docs}_docs_vocab_{args.tokenizer_vocab}": measure(
+            lambda _: BPETokenizer(args.tokenizer_vocab, enable_logs=False).fit(docs), args.repeat
+        ),
+        f"encode_{args.tokenizer_docs}_docs_3K": measure(
+            lambda tokenizer: [tokenizer.encode(d) for d in docs], args.repeat, setup=lambda: load_tokenizer("imdb_tokenizer_3K")
+        ),
+    }
+
+
+BACKEND_GROUPS = {
+    "values": values_cases,
+    "matmul": matmul_cases,
+    "models": models_cases,
+    "optimizers": optimizers_cases,
+    "data_loaders": data_loaders_cases,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    results = {}
+    for group in args.groups:
+        backends = [None] if group == "tokenizer" else args.backends
+        for backend in backends:
+            random.seed(0)
+            np.random.seed(0)
+            cases = tokenizer_cases(args) if backend is None else BACKEND_GROUPS[group](backend, args)
+            for case, result in cases.items():
+                key = f"{group}/{case}" if backend is None else f"{group}/{backend}/{case}"
+                results[key] = result
+                print(f"{key:<60} {1000 * result['median_s']:>12.3f}ms {result['peak_mb']:>10.2f}MB", flush=True)
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "rt") as f:
+        baseline = json.load(f)["results"]
+    print(f"\n{'case':<60} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for key, result in results.items():
+        if key in baseline:
+            ratio = result["median_s"] / baseline[key]["median_s"]
+            print(f"{key:<60} {1000 * baseline[key]['median_s']:>10.3f}ms {1000 * result['median_s']:>10.3f}ms {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--groups", nargs="+", default=GROUPS, choices=GROUPS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--values", type=int, default=10000, help="number of Values created per run")
+    parser.add_argument("--matmul-sizes", nargs="+", type=int, default=[16, 64])
+    parser.add_argument("--batches", type=int, default=50, help="get_batch calls per run")
+    parser.add_argument("--tokenizer-docs", type=int, default=100)
+    parser.add_argument("--tokenizer-vocab", type=int, default=200)
+    parser.add_argument("--output", help="path of the JSON results file")
+    parser.add_argument("--compare", help="JSON results file of a previous run to compare against")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "wt") as f:
+            json.dump({
+                "meta": {
+                    "commit": git_commit(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "platform": platform.platform(),
+                    "args": vars(args),
+                },
+                "results": results,
+            }, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Measures graph node creation throughput of the Python backends.
+
+Run from the repository root:
+    python -m benchmarks.value_creation --n 200000
+"""
+import argparse
+import importlib
+import time
+
+import numpy as np
+
+from benchmarks.common import PYTHON_BACKENDS
+
+
+def timed(func, n):
+    time_point = time.perf_counter()
+    func()
+    elapsed_time = time.perf_counter() - time_point
+    return n / elapsed_time
+
+
+def run(backend, n, matmul_size):
+    Value = importlib.import_module(f"lib.{backend}.value").Value
+    Matrix = importlib.import_module(f"lib.{backend}.linear_algebra").Matrix
+    data = np.random.normal(size=n).tolist()
+    values = [Value(v) for v in data]
+    A = Matrix(np.random.normal(size=(matmul_size, matmul_size)))
+    B = Matrix(np.random.normal(size=(matmul_size, matmul_size)))
+    return {
+        "leaf": timed(lambda: [Value(v) for v in data], n),
+        "add": timed(lambda: [v + v for v in values], n),
+        "hash": timed(lambda: set(values), n),
+        "leaf + grad access": timed(lambda: [Value(v).grad for v in data], n),
+        f"matmul {matmul_size}x{matmul_size}": timed(lambda: A.matmul(B), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=200000)
+    parser.add_argument("--matmul-size", type=int, default=50)
+    parser.add_argument("--backends", nargs="+", default=PYTHON_BACKENDS, choices=PYTHON_BACKENDS)
+    args = parser.parse_args()
+
+    for backend in args.backends:
+        for name, throughput in run(backend, args.n, args.matmul_size).items():
+            unit = "matmuls/s" if name.startswith("matmul") else "nodes/s"
+            print(f"{backend:<17} {name:<18} {throughput:>14,.1f} {unit}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import weakref
+from array import array
+from contextlib import contextmanager
+
 import numpy as np
 
 
@@ -10,42 +14,335 @@ class Op:
     LN = "natural_logarithm"
     MAX = "maximum"
     MIN = "minimum"
+    MATMUL = "matrix_multiply"
+    AXIS_SUM = "axis_sum"
+    INDEX = "index"
+    GATHER_ROWS = "gather_rows"
+    ROW_LOOKUP = "row_lookup"
+    RESHAPE = "reshape"
+    LINEAR = "linear"
+    SIGMOID = "sigmoid"
+    SOFTMAX = "softmax"
+    LOG_SOFTMAX = "log_softmax"
+    LAYER_NORM = "layer_normalization"
+    SUM = "sum"
+    DOT = "dot_product"
+    STACK = "stack"
+
+
+def _axis_sum_rule(in_vars, out_var):
+    X, axis = in_vars
+    grad = out_var.grad if axis is None else np.expand_dims(out_var.grad, axis)
+    return np.broadcast_to(grad, X.data.shape)
+
+
+def _index_rule(in_vars, out_var):
+    X, key = in_vars
+    grad = np.zeros_like(X.data)
+    np.add.at(grad, key, out_var.grad)
+    return grad
+
+
+class RowGrad:
+    """Sparse gradient of a row gather: `values[i]` is added to row `rows[i]`."""
+    __array_ufunc__ = None
+
+    def __init__(self, rows, values):
+        self.rows = rows
+        self.values = values
+
+    def __add__(self, other):
+        if isinstance(other, RowGrad):
+            return RowGrad(np.concatenate([self.rows, other.rows]), np.concatenate([self.values, other.values]))
+        if np.ndim(other) == 0 and other == 0:
+            return self
+        dense = np.array(other, dtype=np.float64)
+        np.add.at(dense, self.rows, self.values)
+        return dense
+
+    __radd__ = __add__
+
+    def coalesce(self):
+        """Equivalent gradient with sorted, unique rows."""
+        rows, inverse = np.unique(self.rows, return_inverse=True)
+        values = np.zeros((len(rows), *self.values.shape[1:]))
+        np.add.at(values, inverse.reshape(-1), self.values)
+        return RowGrad(rows, values)
+
+
+def _gather_rows_rule(in_vars, out_var):
+    X, rows = in_vars
+    grad = np.broadcast_to(out_var.grad, out_var.data.shape)
+    return RowGrad(np.reshape(rows, -1), grad.reshape(-1, *X.data.shape[1:]))
+
+
+def _row_lookup_rule(in_vars, out_var):
+    _, grad_rows, row = in_vars
+    grad_rows.add(row)
+    return out_var.grad
+
+
+def _softmax_rule(in_vars, out_var):
+    grad_out = out_var.grad * out_var.data
+    return grad_out - out_var.data * grad_out.sum(axis=-1, keepdims=True)
+
+
+def _log_softmax_rule(in_vars, out_var):
+    grad = np.broadcast_to(out_var.grad, out_var.data.shape)
+    return grad - np.exp(out_var.data) * grad.sum(axis=-1, keepdims=True)
+
+
+def _layer_norm(X, epsilon):
+    centered = X.data - X.data.mean(axis=-1, keepdims=True)
+    inv_std = 1 / np.sqrt((centered ** 2).mean(axis=-1, keepdims=True) + epsilon)
+    return centered * inv_std, inv_std
+
+
+def _layer_norm_rule(in_vars, out_var):
+    X, scale, _, epsilon = in_vars
+    norm_X, inv_std = _layer_norm(X, epsilon)
+    grad_norm_X = out_var.grad * scale.data
+    return inv_std * (
+        grad_norm_X
+        - grad_norm_X.mean(axis=-1, keepdims=True)
+        - norm_X * (grad_norm_X * norm_X).mean(axis=-1, keepdims=True)
+    )
+
+
+def _layer_norm_scale_rule(in_vars, out_var):
+    X, _, _, epsilon = in_vars
+    return out_var.grad * _layer_norm(X, epsilon)[0]
+
+
+class GradMode:
+    enabled = True
+
+
+@contextmanager
+def no_grad():
+    """Runs the block without recording graph nodes, e.g. for evaluation and inference."""
+    previous = GradMode.enabled
+    GradMode.enabled = False
+    try:
+        yield
+    finally:
+        GradMode.enabled = previous
+
+
+def _sum_rules(n_in_vars):
+    return (lambda in_vars, out_var: out_var.grad,) * n_in_vars
+
+
+def _dot_rules(n_in_vars):
+    vector_len = n_in_vars // 2
+    return tuple(
+        lambda in_vars, out_var, partner=(position + vector_len) % n_in_vars: out_var.grad * in_vars[partner].data
+        for position in range(n_in_vars)
+    )
+
+
+def _stack_rules(n_in_vars):
+    return tuple(
+        lambda in_vars, out_var, position=position: np.broadcast_to(out_var.grad, out_var.data.shape)[in_vars[-1][position]]
+        for position in range(n_in_vars - 1)
+    ) + (None,)
 
 
 class Derivative:
+    """Gradient rules per op: one `(in_vars, out_var)` callable per operand, None for constants."""
     EPSILON = 1e-10
-    
+
+    RULES = {
+        Op.ADD: (
+            lambda in_vars, out_var: out_var.grad,
+            lambda in_vars, out_var: out_var.grad,
+        ),
+        Op.MUL: (
+            lambda in_vars, out_var: out_var.grad * in_vars[1].data,
+            lambda in_vars, out_var: out_var.grad * in_vars[0].data,
+        ),
+        Op.NEG: (
+            lambda in_vars, out_var: -out_var.grad,
+        ),
+        Op.POW: (
+            lambda in_vars, out_var: out_var.grad * in_vars[1] * in_vars[0].data ** (in_vars[1] - 1),
+            None,
+        ),
+        Op.EXP: (
+            lambda in_vars, out_var: out_var.grad * out_var.data,
+        ),
+        Op.LN: (
+            lambda in_vars, out_var: out_var.grad / (in_vars[0].data + Derivative.EPSILON),
+        ),
+        Op.MAX: (
+            lambda in_vars, out_var: out_var.grad * (in_vars[0].data >= in_vars[1]),
+            None,
+        ),
+        Op.MIN: (
+            lambda in_vars, out_var: out_var.grad * (in_vars[0].data <= in_vars[1]),
+            None,
+        ),
+        Op.MATMUL: (
+            lambda in_vars, out_var: out_var.grad @ in_vars[1].data.T,
+            lambda in_vars, out_var: in_vars[0].data.T @ out_var.grad,
+        ),
+        Op.AXIS_SUM: (
+            _axis_sum_rule,
+            None,
+        ),
+        Op.INDEX: (
+            _index_rule,
+            None,
+        ),
+        Op.GATHER_ROWS: (
+            _gather_rows_rule,
+            None,
+        ),
+        Op.ROW_LOOKUP: (
+            _row_lookup_rule,
+            None,
+            None,
+        ),
+        Op.RESHAPE: (
+            lambda in_vars, out_var: np.reshape(out_var.grad, in_vars[0].data.shape),
+        ),
+        Op.LINEAR: (
+            lambda in_vars, out_var: out_var.grad @ in_vars[1].data.T,
+            lambda in_vars, out_var: in_vars[0].data.T @ out_var.grad,
+            lambda in_vars, out_var: out_var.grad,
+        ),
+        Op.SIGMOID: (
+            lambda in_vars, out_var: out_var.grad * out_var.data * (1 - out_var.data),
+        ),
+        Op.SOFTMAX: (
+            _softmax_rule,
+        ),
+        Op.LOG_SOFTMAX: (
+            _log_softmax_rule,
+        ),
+        Op.LAYER_NORM: (
+            _layer_norm_rule,
+            _layer_norm_scale_rule,
+            lambda in_vars, out_var: out_var.grad,
+            None,
+        ),
+    }
+
+    NARY_RULES = {
+        Op.SUM: _sum_rules,
+        Op.DOT: _dot_rules,
+        Op.STACK: _stack_rules,
+    }
+    _nary_rules_cache = {}
+
+    @staticmethod
+    def rules(op, n_in_vars):
+        rules = Derivative.RULES.get(op)
+        if rules is None:
+            rules = Derivative._nary_rules_cache.get((op, n_in_vars))
+            if rules is None:
+                rules = Derivative._nary_rules_cache[(op, n_in_vars)] = Derivative.NARY_RULES[op](n_in_vars)
+        return rules
+
     def __init__(self, op, in_vars, out_var):
         self.op = op
         self.in_vars = in_vars
         self.out_var = out_var
-    
-    def _other_var(self, wrt_var):
-        return [var for var in self.in_vars if var != wrt_var][0]
-    
+
     def __call__(self, wrt_var):
-        part_deriv = None
-        match self.op:
-            case Op.ADD:
-                part_deriv =  1
-            case Op.MUL:
-                other = self._other_var(wrt_var)
-                part_deriv = other.data
-            case Op.NEG:
-                part_deriv = -1
-            case Op.POW:
-                power = self._other_var(wrt_var)
-                part_deriv = power * wrt_var.data ** (power-1)
-            case Op.EXP:
-                part_deriv = np.exp(wrt_var.data)
-            case Op.LN:
-                part_deriv = 1 / (wrt_var.data + self.EPSILON)
-            case Op.MAX:
-                compare_num = self._other_var(wrt_var)
-                part_deriv = 1 if wrt_var.data >= compare_num else 0
-            case Op.MIN:
-                compare_num = self._other_var(wrt_var)
-                part_deriv = 1 if wrt_var.data <= compare_num else 0
-    
-        return self.out_var.grad * part_deriv
-       
\ No newline at end of file
+        return sum(
+            rule(self.in_vars, self.out_var)
+            for rule, in_var in zip(self.rules(self.op, len(self.in_vars)), self.in_vars)
+            if rule is not None and in_var is wrt_var
+        )
+
+
+class Tape:
+    """Flat record of ops walked in reverse by backward; entries die with their output node."""
+    OPS = tuple(op for name, op in vars(Op).items() if name.isupper())
+    OP_CODES = {op: code for code, op in enumerate(OPS)}
+    RULES = tuple(Derivative.RULES.get(op) for op in OPS)
+
+    def __init__(self, node_type, propagate, sweep_size=1024):
+        self.node_type = node_type
+        self.propagate = propagate
+        self.sweep_size = sweep_size
+        self.nodes = []
+        self.clear()
+
+    def __len__(self):
+        return len(self.ops)
+
+    def _tape_id(self, var):
+        if isinstance(var, self.node_type):
+            if var._tape_id is None:
+                var._tape_id = len(self.nodes)
+                self.nodes.append(weakref.ref(var))
+            return var._tape_id
+        self.nodes.append(None)
+        return len(self.nodes) - 1
+
+    def record(self, op, in_vars, out_var):
+        if len(self.ops) >= self._sweep_at:
+            self._sweep()
+        for in_var in in_vars:
+            self.in_ids.append(self._tape_id(in_var))
+        self.in_ends.append(len(self.in_ids))
+        self.out_ids.append(self._tape_id(out_var))
+        self.ops.append(self.OP_CODES[op])
+        self.inputs.append(in_vars)
+
+    def _sweep(self):
+        live = []
+        for entry in range(len(self.ops) - 1, -1, -1):
+            if self.inputs[entry] is None:
+                continue
+            out_var = self.nodes[self.out_ids[entry]]()
+            if out_var is None:
+                self.inputs[entry] = None
+            else:
+                live.append((self.OPS[self.ops[entry]], self.inputs[entry], out_var))
+        if 2 * len(live) <= len(self.ops):
+            self.clear()
+            self._sweep_at = float("inf")
+            for op, in_vars, out_var in reversed(live):
+                self.record(op, in_vars, out_var)
+        self._sweep_at = max(self.sweep_size, 2 * len(self.ops))
+
+    def backward(self, out_var, retain_graph=False):
+        nodes, ops, in_ids, in_ends, out_ids = self.nodes, self.ops, self.in_ids, self.in_ends, self.out_ids
+        if out_var._tape_id is not None:
+            reached = bytearray(len(nodes))
+            reached[out_var._tape_id] = 1
+            entries = []
+            for entry in range(len(ops) - 1, -1, -1):
+                if not reached[out_ids[entry]] or self.inputs[entry] is None:
+                    continue
+                for in_id in in_ids[in_ends[entry - 1] if entry else 0:in_ends[entry]]:
+                    reached[in_id] = 1
+                entries.append((entry, nodes[out_ids[entry]]()))
+            for entry, entry_out_var in entries:
+                if entry_out_var is not out_var:
+                    entry_out_var.grad = 0
+            for entry, entry_out_var in entries:
+                in_vars = self.inputs[entry]
+                rules = self.RULES[ops[entry]] or Derivative.rules(self.OPS[ops[entry]], len(in_vars))
+                self.propagate(rules, in_vars, entry_out_var)
+            if not retain_graph:
+                for entry, _ in entries:
+                    self.inputs[entry] = None
+        if not retain_graph and all(in_vars is None for in_vars in self.inputs):
+            self.clear()
+
+    def clear(self):
+        for node_ref in self.nodes:
+            node = node_ref() if node_ref is not None else None
+            if node is not None:
+                node._tape_id = None
+        self.nodes = []
+        self.inputs = []
+        self.ops = array("B")
+        self.in_ids = array("q")
+        self.in_ends = array("q")
+        self.out_ids = array("q")
+        self._sweep_at = self.sweep_size
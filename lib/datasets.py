@@ -0,0 +1,137 @@
+import csv
+import json
+import os
+
+import numpy as np
+
+CACHE_DIR = "artifacts/datasets"
+CACHE_VERSION = 1
+
+
+class StringColumn:
+    """Strings stored as one utf-8 byte blob plus row offsets, decoded only when accessed."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @staticmethod
+    def from_strings(strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.cumsum([0] + [len(s) for s in encoded], dtype=np.int64)
+        return StringColumn(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return self.blob[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def tolist(self):
+        return list(self)
+
+
+class Dataset:
+    """Named columns: NumPy (memory-mapped when loaded from the cache) arrays or `StringColumn`s."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def names(self):
+        return list(self.columns)
+
+    def to_array(self, names=None):
+        """Stacks numeric columns into a float64 (rows, columns) array."""
+        names = self.names() if names is None else names
+        return np.column_stack([np.asarray(self.columns[name], dtype=np.float64) for name in names])
+
+    def matrix(self, matrix_type, names=None):
+        """Builds a backend `Matrix` from numeric columns, ready for `gd_data_loaders`."""
+        return matrix_type.from_array(self.to_array(names))
+
+
+def _parse_column(values):
+    for dtype in (np.int64, np.float64):
+        try:
+            return np.array(values, dtype=dtype)
+        except ValueError:
+            pass
+    return StringColumn.from_strings(values)
+
+
+def _parse(path, header, delimiter):
+    with open(path, "rt", newline="") as f:
+        if delimiter is None:
+            rows = [line.split() for line in f if line.strip()]
+        else:
+            rows = [row for row in csv.reader(f, delimiter=delimiter) if row]
+    names = rows.pop(0) if header else [f"col{idx}" for idx in range(len(rows[0]))]
+    return Dataset({name: _parse_column(list(values)) for name, values in zip(names, zip(*rows))})
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _save(dataset, cache_dir, schema):
+    os.makedirs(cache_dir, exist_ok=True)
+    schema["columns"] = []
+    for idx, (name, column) in enumerate(dataset.columns.items()):
+        if isinstance(column, StringColumn):
+            np.save(os.path.join(cache_dir, f"{idx}.offsets.npy"), column.offsets)
+            np.save(os.path.join(cache_dir, f"{idx}.utf8.npy"), column.blob)
+            schema["columns"].append({"name": name, "type": "str"})
+        else:
+            np.save(os.path.join(cache_dir, f"{idx}.npy"), column)
+            schema["columns"].append({"name": name, "type": str(column.dtype)})
+    with open(os.path.join(cache_dir, "schema.json"), "wt") as f:
+        json.dump(schema, f, indent=2)
+
+
+def _load(cache_dir, schema):
+    columns = {}
+    for idx, column in enumerate(schema["columns"]):
+        if column["type"] == "str":
+            columns[column["name"]] = StringColumn(
+                np.load(os.path.join(cache_dir, f"{idx}.offsets.npy"), mmap_mode="r"),
+                np.load(os.path.join(cache_dir, f"{idx}.utf8.npy"), mmap_mode="r"),
+            )
+        else:
+            columns[column["name"]] = np.load(os.path.join(cache_dir, f"{idx}.npy"), mmap_mode="r")
+    return Dataset(columns)
+
+
+def load_dataset(path, header=None, delimiter=None):
+    """Loads a delimited text dataset from `data/`, cached in columnar form under `CACHE_DIR`."""
+    is_csv = path.endswith(".csv")
+    header = is_csv if header is None else header
+    if delimiter is None and not is_csv:
+        with open(path, "rt") as f:
+            delimiter = "," if "," in f.readline() else None
+    elif delimiter is None:
+        delimiter = ","
+
+    cache_dir = os.path.join(CACHE_DIR, os.path.basename(path))
+    schema = {"version": CACHE_VERSION, "source": _source_stamp(path), "header": header, "delimiter": delimiter}
+    schema_path = os.path.join(cache_dir, "schema.json")
+    if os.path.exists(schema_path):
+        with open(schema_path, "rt") as f:
+            cached_schema = json.load(f)
+        if {k: cached_schema.get(k) for k in schema} == schema:
+            return _load(cache_dir, cached_schema)
+
+    dataset = _parse(path, header, delimiter)
+    _save(dataset, cache_dir, schema)
+    return dataset
@@ -1,55 +1,216 @@
+import math
+import queue
 import random
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from lib.parallel import map_chunks
+from lib.processing import as_array
+
+_worker_loader = None
+
+
+def _init_loader_worker(loader):
+    global _worker_loader
+    _worker_loader = loader
+
+
+def _assemble_arrays(indexes):
+    return [(type(batch), as_array(batch)) for batch in _worker_loader._assemble(indexes)]
+
+
+def _prefetch_batches(loader_ref, batches, stop):
+    batch = None
+    while not stop.is_set():
+        if batch is None:
+            loader = loader_ref()
+            if loader is None:
+                return
+            try:
+                batch = loader._next_batch()
+            except Exception as e:
+                batch = e
+            del loader
+        try:
+            batches.put(batch, timeout=0.1)
+            batch = None
+        except queue.Full:
+            pass
 
 
 class DataLoader:
-    def __init__(self, X, y):
+    """Base data loader: `get_batch()` is endless, iteration yields one epoch."""
+
+    def __init__(self, X, y, prefetch=0, transform=None, workers=0, worker_processes=False):
         self.X = X
         self.y = y
-    
+        self.prefetch = prefetch
+        self.transform = transform
+        self.workers = workers
+        self.worker_processes = worker_processes
+        self.epoch = 0
+        self._batches = None
+        self._stop = threading.Event()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_batches"] = None
+        del state["_stop"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._epoch_indexes())
+
+    def __iter__(self):
+        batch_indexes = self._epoch_indexes()
+        self.epoch += 1
+        if not self.workers:
+            yield from map(self._assemble, batch_indexes)
+            return
+        if self.worker_processes:
+            for batch in map_chunks(_assemble_arrays, batch_indexes, self.workers, _init_loader_worker, (self, )):
+                yield tuple(batch_type.from_array(array) for batch_type, array in batch)
+            return
+        with ThreadPoolExecutor(self.workers) as executor:
+            pending = deque()
+            for indexes in batch_indexes:
+                pending.append(executor.submit(self._assemble, indexes))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
     def get_batch(self):
+        if not self.prefetch:
+            return self._next_batch()
+        if self._batches is None:
+            self._batches = queue.Queue(self.prefetch)
+            threading.Thread(target=_prefetch_batches, args=(weakref.ref(self), self._batches, self._stop), daemon=True).start()
+        batch = self._batches.get()
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+    def close(self):
+        self._stop.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def _gather(self, indexes):
+        return self.X, self.y
+
+    def _assemble(self, indexes):
+        X_batch, y_batch = self._gather(indexes)
+        return self.transform(X_batch, y_batch) if self.transform else (X_batch, y_batch)
+
+    def _epoch_indexes(self):
+        pass
+
+    def _next_batch(self):
         pass
 
 
 class BatchDataLoader(DataLoader):
-    def get_batch(self):
-        return self.X, self.y
+    def _epoch_indexes(self):
+        return [None]
+
+    def _next_batch(self):
+        return self._assemble(None)
+
+
+class IndexedDataLoader(DataLoader):
+    """Holds X and y as contiguous arrays and builds batches by gathering rows by index."""
+
+    def __init__(self, X, y, prefetch=0, transform=None, workers=0, seed=None, worker_processes=False):
+        super().__init__(X, y, prefetch, transform, workers, worker_processes)
+        self.X_array = X.to_array()
+        self.y_array = y.to_array()
+        self.rows_len = len(self.X_array)
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng = np.random.default_rng(self.seed)
 
+    def _gather(self, indexes):
+        return type(self.X).from_array(self.X_array[indexes]), type(self.y).from_array(self.y_array[indexes])
 
-class StochasticDataLoader(DataLoader):
-    def __init__(self, X, y):
-        super().__init__(X, y)
+
+class StochasticDataLoader(IndexedDataLoader):
+    def __init__(self, X, y, prefetch=0, transform=None, workers=0, worker_processes=False):
+        super().__init__(X, y, prefetch, transform, workers, worker_processes=worker_processes)
         self.current_step = 0
 
-    def get_batch(self):
-        indices = [self.current_step]
-        if self.current_step < self.X.dims()[0] - 1:
+    def __len__(self):
+        return self.rows_len
+
+    def _epoch_indexes(self):
+        return [[idx] for idx in range(self.rows_len)]
+
+    def _next_batch(self):
+        indexes = [self.current_step]
+        if self.current_step < self.rows_len - 1:
             self.current_step += 1
         else:
             self.current_step = 0
-        return self.X.rows(indices), self.y.rows(indices)
+        return self._assemble(indexes)
+
 
+class MiniBatchDataLoader(IndexedDataLoader):
+    """Shuffled mini-batches; `last_batch` is "keep", "drop" or "pad"."""
 
-class MiniBatchDataLoader(DataLoader):
-    def __init__(self, X, y, batch_size=16):
-        super().__init__(X, y)
+    LAST_BATCH_POLICIES = ("keep", "drop", "pad")
+
+    def __init__(self, X, y, batch_size=16, prefetch=0, transform=None, workers=0, seed=None, last_batch="keep",
+                 worker_processes=False):
+        if last_batch not in self.LAST_BATCH_POLICIES:
+            raise ValueError(f"last_batch should be one of {self.LAST_BATCH_POLICIES}, got '{last_batch}'")
+        super().__init__(X, y, prefetch, transform, workers, seed, worker_processes)
         self.current_step = 0
         self.batch_size = batch_size
+        self.last_batch = last_batch
         self.indexes = self._regenerate_indexes()
 
+    def __len__(self):
+        if self.last_batch == "drop":
+            return self.rows_len // self.batch_size
+        return math.ceil(self.rows_len / self.batch_size)
+
+    def _epoch_indexes(self):
+        indexes = np.random.default_rng((self.seed, self.epoch)).permutation(self.rows_len)
+        batch_indexes = [indexes[start:start + self.batch_size] for start in range(0, self.rows_len, self.batch_size)]
+        rest_len = self.batch_size - len(batch_indexes[-1])
+        if rest_len and self.last_batch == "drop":
+            batch_indexes.pop()
+        elif rest_len and self.last_batch == "pad":
+            batch_indexes[-1] = np.concatenate([batch_indexes[-1], np.resize(indexes, rest_len)])
+        return batch_indexes
+
     def _regenerate_indexes(self):
-        rows_len = self.X.dims()[0]
-        return random.sample(range(rows_len), rows_len)
+        return self.rng.permutation(self.rows_len)
 
-    def get_batch(self):
+    def _next_batch(self):
         next_step = self.current_step + self.batch_size
-        if next_step >= self.X.dims()[0]:
-            rest_len = next_step - self.X.dims()[0]
+        if next_step >= self.rows_len:
+            rest_len = next_step - self.rows_len
             batch_indexes = self.indexes[self.current_step:]
             self.indexes = self._regenerate_indexes()
-            batch_indexes.extend(self.indexes[:rest_len])
+            batch_indexes = np.concatenate([batch_indexes, self.indexes[:rest_len]])
             self.current_step = rest_len
         else:
             batch_indexes = self.indexes[self.current_step:next_step]
             self.current_step = next_step
-            
-        return self.X.rows(batch_indexes), self.y.rows(batch_indexes)
+
+        return self._assemble(batch_indexes)
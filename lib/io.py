@@ -1,16 +1,213 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from lib.processing import as_array
 from lib.tokenization import BPETokenizer
 
+TOKENIZER_MAGIC = b"BPET"
+TOKENIZER_VERSION = 1
+# magic, version, max_vocab, pretokenize, |vocab|, |merges|
+_TOKENIZER_HEADER = struct.Struct("<4sIIBII")
+
 
 def save_tokenizer(tokenizer, name):
-    with open(f"artifacts/tokenizers/{name}.tok", "wt") as f:
-        f.write(str(tokenizer.max_vocab) + "\n")
-        for token in tokenizer.vocab:
-            f.write(token + "\n")
+    """Writes the tokenizer to `artifacts/tokenizers/{name}.bpe`."""
+    encoded_vocab = [token.encode("utf-8") for token in tokenizer.vocab]
+    offsets = np.cumsum([0] + [len(token) for token in encoded_vocab], dtype="<u4")
+    merges = np.array([(left, right, merged) for (left, right), merged in tokenizer.merges.items()], dtype="<u4").reshape(-1, 3)
+    with open(f"artifacts/tokenizers/{name}.bpe", "wb") as f:
+        f.write(_TOKENIZER_HEADER.pack(
+            TOKENIZER_MAGIC, TOKENIZER_VERSION, tokenizer.max_vocab, tokenizer.pretokenize, len(encoded_vocab), len(merges)
+        ))
+        f.write(offsets.tobytes())
+        f.write(b"".join(encoded_vocab))
+        f.write(merges.tobytes())
 
-def load_tokenizer(name):
-    with open(f"artifacts/tokenizers/{name}.tok", "rt") as f:
+
+def _load_binary_tokenizer(path):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        magic, version, max_vocab, pretokenize, vocab_size, merges_size = _TOKENIZER_HEADER.unpack_from(buffer)
+        if magic != TOKENIZER_MAGIC:
+            raise ValueError(f"{path} is not a tokenizer file")
+        if version != TOKENIZER_VERSION:
+            raise ValueError(f"Unsupported tokenizer file version {version}")
+
+        start = _TOKENIZER_HEADER.size
+        offsets = np.frombuffer(buffer, dtype="<u4", count=vocab_size + 1, offset=start).tolist()
+        start += 4 * (vocab_size + 1)
+        blob = buffer[start:start + offsets[-1]]
+        start += offsets[-1]
+        merges = np.frombuffer(buffer, dtype="<u4", count=3 * merges_size, offset=start).reshape(-1, 3).tolist()
+
+    tokenizer = BPETokenizer(max_vocab, pretokenize=bool(pretokenize))
+    tokenizer.vocab = [blob[begin:end].decode("utf-8") for begin, end in zip(offsets, offsets[1:])]
+    tokenizer.merges = {(left, right): merged for left, right, merged in merges}
+    return tokenizer
+
+
+def _load_legacy_tokenizer(path):
+    with open(path, "rt") as f:
         lines = [t[:-1] for t in f.readlines()]
         tokenizer = BPETokenizer()
         tokenizer.max_vocab = int(lines[0])
         tokenizer.vocab = lines[1:]
-        return tokenizer
\ No newline at end of file
+        return tokenizer
+
+
+def load_tokenizer(name):
+    """Loads `artifacts/tokenizers/{name}.bpe`, falling back to the legacy one token per line `.tok` file."""
+    path = f"artifacts/tokenizers/{name}.bpe"
+    if os.path.exists(path):
+        return _load_binary_tokenizer(path)
+    return _load_legacy_tokenizer(f"artifacts/tokenizers/{name}.tok")
+
+
+CHECKPOINT_MAGIC = b"NNCK"
+CHECKPOINT_VERSION = 1
+# magic, version, json header size
+_CHECKPOINT_HEADER = struct.Struct("<4sII")
+# saved parameters per layer type: (name, pt_backend attribute path, stored transposed in pt_backend)
+CHECKPOINT_LAYER_PARAMS = {
+    "Linear": [("W", "linear.weight", True), ("b", "linear.bias", False)],
+    "LayerNorm": [("scale", "layer_norm.weight", False), ("bias", "layer_norm.bias", False)],
+    "Embedding": [("embedding", "embedding.weight", False)],
+}
+CHECKPOINT_OPTIMIZER_STATE = ["grad_accums", "grad_accums1", "grad_accums2"]
+CHECKPOINT_OPTIMIZER_SCALARS = ["learning_rate", "momentum_coef", "momentum_coef1", "momentum_coef2", "time"]
+
+
+def _is_torch(obj):
+    return hasattr(obj, "detach")
+
+
+def _named_params(nn):
+    """Yields (key, param, transposed) for the saved parameters of every layer, in a backend independent layout."""
+    for layer_idx, layer in enumerate(nn.layers):
+        for name, pt_path, transposed in CHECKPOINT_LAYER_PARAMS.get(type(layer).__name__, []):
+            if hasattr(layer, "named_parameters"):
+                param = layer
+                for attr in pt_path.split("."):
+                    param = getattr(param, attr)
+                yield f"{layer_idx}.{name}", param, transposed
+            else:
+                yield f"{layer_idx}.{name}", getattr(layer, name), False
+
+
+def _param_array(param, transposed):
+    if _is_torch(param):
+        array = param.detach().numpy().astype(np.float64)
+        return array.T if transposed else array
+    return as_array(param).astype(np.float64)
+
+
+def _set_param_array(param, transposed, array):
+    if _is_torch(param):
+        param.data.copy_(param.data.new_tensor(array.T if transposed else array))
+    elif isinstance(param, np.ndarray):
+        param[...] = array
+    elif isinstance(getattr(param, "data", None), np.ndarray):
+        param.data[...] = array
+    else:
+        for v, data in zip(param.all_values(), array.reshape(-1).tolist()):
+            v.data = data
+
+
+def _optimizer_param_states(nn, optimizer, state_name):
+    """Maps saved parameter keys to views of the optimizer's `state_name` accumulator for that parameter."""
+    state = getattr(optimizer, state_name)
+    if isinstance(state, list):
+        param_idxs = {id(p): idx for idx, p in enumerate(optimizer.params)}
+        return {key: (state[param_idxs[id(param)]], transposed)
+                for key, param, transposed in _named_params(nn) if id(param) in param_idxs}
+
+    value_idxs = {id(v): idx for idx, v in enumerate(optimizer.all_values)}
+    states = {}
+    for key, param, _ in _named_params(nn):
+        values = param.all_values()
+        if id(values[0]) in value_idxs:
+            start, end = optimizer.bounds[value_idxs[id(values[0])]][0], optimizer.bounds[value_idxs[id(values[-1])]][1]
+            states[key] = (state[start:end].reshape(_param_array(param, False).shape), False)
+    return states
+
+
+def save_checkpoint(nn, name, optimizer=None):
+    """Writes layer configuration, parameters and optimizer state to `artifacts/checkpoints/{name}.ckpt`."""
+    arrays = {f"params.{key}": _param_array(param, transposed) for key, param, transposed in _named_params(nn)}
+    description = {
+        "layers": [type(layer).__name__ for layer in nn.layers],
+        "optimizer": None,
+        "arrays": {},
+    }
+    if optimizer is not None:
+        description["optimizer"] = {
+            "type": type(optimizer).__name__,
+            "scalars": {attr: getattr(optimizer, attr) for attr in CHECKPOINT_OPTIMIZER_SCALARS if hasattr(optimizer, attr)},
+        }
+        for state_name in CHECKPOINT_OPTIMIZER_STATE:
+            if hasattr(optimizer, state_name):
+                for key, (state, transposed) in _optimizer_param_states(nn, optimizer, state_name).items():
+                    arrays[f"optimizer.{state_name}.{key}"] = _param_array(state, transposed)
+
+    offset = 0
+    for key, array in arrays.items():
+        description["arrays"][key] = {"shape": list(array.shape), "offset": offset}
+        offset += 8 * array.size
+    header = json.dumps(description).encode("utf-8")
+    header += b" " * (-(_CHECKPOINT_HEADER.size + len(header)) % 8)
+
+    os.makedirs("artifacts/checkpoints", exist_ok=True)
+    with open(f"artifacts/checkpoints/{name}.ckpt", "wb") as f:
+        f.write(_CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(header)))
+        f.write(header)
+        for array in arrays.values():
+            f.write(np.ascontiguousarray(array, dtype="<f8").tobytes())
+
+
+def load_checkpoint(nn, name, optimizer=None):
+    """Loads a checkpoint written by any backend into `nn` (and `optimizer`), built with the same layers."""
+    path = f"artifacts/checkpoints/{name}.ckpt"
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        magic, version, header_size = _CHECKPOINT_HEADER.unpack_from(buffer)
+        if magic != CHECKPOINT_MAGIC:
+            raise ValueError(f"{path} is not a checkpoint file")
+        if version != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint file version {version}")
+        start = _CHECKPOINT_HEADER.size
+        description = json.loads(bytes(buffer[start:start + header_size]))
+        start += header_size
+
+        layers = [type(layer).__name__ for layer in nn.layers]
+        if layers != description["layers"]:
+            raise ValueError(f"Checkpoint layers {description['layers']} do not match the model layers {layers}")
+
+        targets = [(f"params.{key}", param, transposed) for key, param, transposed in _named_params(nn)]
+        if optimizer is not None:
+            if description["optimizer"] is None:
+                raise ValueError(f"{path} holds no optimizer state")
+            for state_name in CHECKPOINT_OPTIMIZER_STATE:
+                if hasattr(optimizer, state_name):
+                    targets += [(f"optimizer.{state_name}.{key}", state, transposed)
+                                for key, (state, transposed) in _optimizer_param_states(nn, optimizer, state_name).items()]
+
+        # validate everything first: no array views into the mapping may outlive it
+        for key, target, transposed in targets:
+            if key not in description["arrays"]:
+                raise ValueError(f"{path} holds no array '{key}'")
+            shape, expected_shape = tuple(description["arrays"][key]["shape"]), _param_array(target, transposed).shape
+            if shape != expected_shape:
+                raise ValueError(f"Checkpoint array '{key}' has shape {shape}, expected {expected_shape}")
+
+        for key, target, transposed in targets:
+            spec = description["arrays"][key]
+            array = np.frombuffer(buffer, dtype="<f8", count=int(np.prod(spec["shape"])), offset=start + spec["offset"])
+            _set_param_array(target, transposed, array.reshape(spec["shape"]))
+            del array
+
+    if optimizer is not None:
+        for attr, value in description["optimizer"]["scalars"].items():
+            if hasattr(optimizer, attr):
+                setattr(optimizer, attr, value)
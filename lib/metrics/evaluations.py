@@ -1,2 +1,6 @@
+from lib.calculus import no_grad
+
+
 def accuracy(actual, predicted):
-    return sum([round(pred[0].data) == act[0].data for pred, act in zip(predicted, actual)])/actual.dims()[0]
+    with no_grad():
+        return sum([round(pred[0].data) == act[0].data for pred, act in zip(predicted, actual)])/actual.dims()[0]
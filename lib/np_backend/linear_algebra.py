@@ -1,105 +1,122 @@
 import numpy as np
+
+from lib.calculus import Op
 from lib.np_backend.value import Value
 
 
-class Vector(np.ndarray):
-    def __new__(cls, values):
-        are_value_types = isinstance(values[0], Value)
-        if are_value_types:
-            return np.asarray(values, dtype=object).view(cls)
-        else:
-            return np.asarray([Value(v) for v in values], dtype=object).view(cls)
+def _index(key):
+    return int(key.data) if isinstance(key, Value) else key
 
-    def dim(self):
-        return len(self)
 
-    def sum(self):
-        return sum(self)
+def _value_positions(values, position=()):
+    if isinstance(values, Value):
+        yield position, values
+    elif isinstance(values, (list, tuple)):
+        for idx, v in enumerate(values):
+            if isinstance(v, (Value, list, tuple)):
+                yield from _value_positions(v, (*position, idx))
+
+
+def _init_from(out, values):
+    Value.__init__(out, np.array(values, dtype=np.float64))
+    value_positions = list(_value_positions(values))
+    if value_positions:
+        positions, in_vars = zip(*value_positions)
+        Value._add_to_graph(Op.STACK, [*in_vars, positions], out)
+
+
+def _indices(keys):
+    if isinstance(keys, Value):
+        return keys.data.astype(int)
+    return [_index(key) for key in keys]
+
+
+class Vector(Value, ndim=1):
+    __slots__ = ()
+
+    def __init__(self, values):
+        _init_from(self, values)
+
+    def dim(self):
+        return len(self.data)
 
     def mean(self):
         return self.sum() / self.dim()
 
     def var(self):
-        return sum([(v - self.mean()) ** 2 for v in self]) / self.dim()
+        centered = self - self.mean()
+        return Value.dot([centered], [centered]) / self.dim()
 
     def std(self):
         return self.var() ** 0.5
 
     def dotprod(self, other):
-        return sum(self * other)
+        return Value.dot([self], [other])
 
     def all_values(self):
-        return self
-
-
-class Matrix(np.ndarray):
-    def __new__(cls, values):
-        are_value_types = isinstance(values[0][0], Value)
-        if are_value_types:
-            return np.asarray(values, dtype=object).view(cls)
-        else:
-            return np.asarray([[Value(v) for v in row] for row in values], dtype=object).view(cls)
+        return [self]
 
-    def dims(self):
-        return self.shape
 
-    def _apply(self, value_func, *args):
-        self = np.vectorize(lambda x: value_func(x, *args), otypes=[object])(self)
-        return self
-    
-    def max(self, num):
-        return self._apply(Value.max, num)
-        
-    def min(self, num):
-        return self._apply(Value.min, num)
+class Matrix(Value, ndim=2):
+    __slots__ = ()
 
-    def exp(self):
-        return self._apply(Value.exp)
+    def __init__(self, values):
+        _init_from(self, values)
 
-    def ln(self):
-        return self._apply(Value.ln)
+    def dims(self):
+        return self.data.shape
 
     def all_values(self):
-        return self.flatten().tolist()
-    
+        return [self]
+
     def row(self, key):
-        return Vector(self[key])
+        return self[_index(key)]
 
     def rows(self, keys):
-        return Matrix(self[[int(key.data) if isinstance(key, Value) else key for key in keys], :])
-        
+        return self[_indices(keys)]
+
     def col(self, key):
-        return Vector(self[:, key])
+        return self[:, _index(key)]
 
-    def cols(self, key):
-        return Matrix(self[:, [int(key.data) if isinstance(key, Value) else key for key in keys]])
+    def cols(self, keys):
+        return self[:, _indices(keys)]
 
     def row_sum(self):
-        return Vector(self.sum(1))
-     
+        return self.sum(1)
+
     def col_sum(self):
-        return Vector(self.sum(0))
+        return self.sum(0)
 
     def matmul(self, other):
-        return Matrix(self @ other)
+        return self @ other
+
+    def to_array(self):
+        return self.data
+
+    @staticmethod
+    def from_array(array):
+        return Value._wrap(array)
 
     @staticmethod
     def broadcast(vector, n, axis=0):
         if axis == 0:
-            return Matrix(np.tile(vector, (n, 1)).T)
+            return vector.reshape(-1, 1) + np.zeros((1, n))
         elif axis == 1:
-            return Matrix(np.tile(vector, (n, 1)))
+            return vector.reshape(1, -1) + np.zeros((n, 1))
+
 
+class Tensor3D(Value, ndim=3):
+    __slots__ = ()
 
-class Tensor3D:
     def __init__(self, matrices):
-        self.matrices = matrices
+        _init_from(self, matrices)
+
+    @property
+    def matrices(self):
+        return list(self)
 
     def dims(self):
         return self.shape
 
-    def __str__(self):
-        return f"Tensor([{[str(m) for m in self.matrices]}])"
-
-    def __repr__(self):
-        return str(self)
+    def all_values(self):
+        return [self]
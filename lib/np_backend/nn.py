@@ -1,6 +1,7 @@
 import numpy as np
 
-from lib.np_backend.linear_algebra import Vector, Matrix, Tensor3D
+from lib.calculus import no_grad
+from lib.np_backend.linear_algebra import Vector, Matrix
 
 EPSILON = 1e-5
 
@@ -26,7 +27,7 @@ class Linear(Layer):
         self.b = Vector(np.zeros(fan_out))
 
     def forward(self, X):
-        out = Matrix.matmul(X, self.W) + self.b
+        out = X.linear(self.W, self.b)
         return out
 
     def params(self):
@@ -40,13 +41,17 @@ class ReLU(Layer):
 
 class Sigmoid(Layer):
     def forward(self, X):
-        return 1 / (1 + (-X).exp())
+        return X.sigmoid()
 
 
 class Softmax(Layer):
     def forward(self, X):
-        exp_X = X.exp()
-        return exp_X / (Matrix.broadcast(exp_X.row_sum(), X.dims()[1]) + EPSILON)
+        return X.softmax()
+
+
+class LogSoftmax(Layer):
+    def forward(self, X):
+        return X.log_softmax()
 
 
 class Embedding(Layer):
@@ -54,13 +59,16 @@ class Embedding(Layer):
         self.embedding = Matrix(np.random.normal(size=(vocab_size, emb_dim)))
 
     def forward(self, X):
-        out = Tensor3D([self.embedding.rows(seq) for seq in X])
+        out = self.embedding.gather_rows(np.asarray(X, dtype=int))
         return out
 
+    def params(self):
+        return [self.embedding]
+
 
 class Flatten(Layer):
     def forward(self, X):
-        out = Matrix([[channel for channels in sequence for channel in channels] for sequence in X.matrices])
+        out = X.reshape(X.dims()[0], -1)
         return out
 
 
@@ -69,18 +77,15 @@ class MaxPooling(Layer):
         self.size = size
         self.stride = stride
 
-    def _maxpool(self, channels):
-        pooled_channels = []
-        step = 0
-        while True:
-            pooled_channels.append(max(channels[step:step + self.size]))
-            step += self.stride
-            if step >= len(channels):
-                break
-        return pooled_channels
+    def _windows(self, channels_len):
+        starts = np.arange(0, channels_len, self.stride)
+        return np.minimum(starts[:, None] + np.arange(self.size), channels_len - 1)
 
     def forward(self, X):
-        out = Tensor3D([[self._maxpool(channels) for channels in sequence] for sequence in X.matrices])
+        windows = self._windows(X.dims()[-1])
+        argmax = X.data[..., windows].argmax(-1)
+        leading = np.ix_(*[np.arange(d) for d in X.dims()[:-1]], np.arange(len(windows)))
+        out = X[(*leading[:-1], windows[leading[-1], argmax])]
         return out
 
 
@@ -90,13 +95,7 @@ class LayerNorm(Layer):
         self.bias = Vector([0 for _ in range(fan_in)])
 
     def forward(self, X):
-        norm_rows = []
-        for r in range(X.dims()[0]):
-            row = X.row(r)
-            norm_row = ((row - row.mean()) / row.std())
-            norm_rows.append(norm_row)
-        norm_X = Matrix(norm_rows)
-        out = norm_X * Matrix.broadcast(self.scale, norm_X.dims()[0], axis=1) + Matrix.broadcast(self.bias, norm_X.dims()[0],  axis=1)
+        out = X.layer_norm(self.scale, self.bias, EPSILON)
         return out
 
     def params(self):
@@ -115,6 +114,10 @@ class NN:
             X = l(X)
         return X
 
+    def predict(self, X):
+        with no_grad():
+            return self.forward(X)
+
     def params(self):
         params = []
         for l in self.layers:
@@ -2,130 +2,224 @@ from numbers import Number
 
 import numpy as np
 
-from lib.calculus import Derivative, Op
+from lib.calculus import Derivative, GradMode, Op, RowGrad, Tape
 
 
 class Value:
-    __slots__ = ("data", "grad", "children", "_backward", "_backprop_order_cache")
+    """Array-valued graph node: one node per op, data kept in a float64 ndarray."""
+
+    __slots__ = ("data", "grad", "children", "_backward", "_backprop_order_cache", "_tape_id", "__weakref__")
+
+    _types_by_ndim = {}
+    _tape = None
+
+    def __init_subclass__(cls, ndim=None, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if ndim is not None:
+            Value._types_by_ndim[ndim] = cls
 
     def __init__(self, data):
-        self.data = float(data)
+        data = np.asarray(data, dtype=np.float64)
+        self.data = data[()] if data.ndim == 0 else data
         self.grad = 0
         self.children = set()
         self._backward = lambda: 0
         self._backprop_order_cache = None
+        self._tape_id = None
+
+    @staticmethod
+    def _wrap(data):
+        data = np.asarray(data, dtype=np.float64)
+        out = object.__new__(Value._types_by_ndim.get(data.ndim, Value))
+        Value.__init__(out, data)
+        return out
 
     def __str__(self):
-        return str(f"{{{round(self.data, 2)}, {round(self.grad, 2)}}}")
+        if self.data.ndim == 0:
+            return str(f"{{{round(float(self.data), 2)}, {round(float(self.grad), 2)}}}")
+        return f"{type(self).__name__}({np.round(self.data, 2).tolist()})"
 
     def __repr__(self):
         return str(self)
 
     ### START - numpy compatibility methods ###
 
+    __array_ufunc__ = None
+
     def __float__(self):
-        return self.data
-    
+        return float(self.data)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.data, dtype=dtype)
+
     @property
-    def __array_struct__(self):
-        return np.array(self.data).__array_struct__
+    def shape(self):
+        return self.data.shape
 
     def conjugate(self):
         return self
-        
+
     def sqrt(self):
         return self ** 0.5
 
     ### END ###
 
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, key):
+        out = Value._wrap(self.data[key])
+        Value._add_to_graph(Op.INDEX, [self, key], out)
+        return out
+
+    def gather_rows(self, rows):
+        """Rows of a 2D leaf (e.g. an embedding table) with a sparse `RowGrad` gradient."""
+        rows = np.asarray(rows, dtype=int)
+        out = Value._wrap(self.data[rows])
+        Value._add_to_graph(Op.GATHER_ROWS, [self, rows], out)
+        return out
+
     def __add__(self, other):
-        if isinstance(other, Number):
+        if not isinstance(other, Value):
             other = Value(other)
-        out = Value(self.data + other.data)
-        out.children.update([self, other])
-        out._backward = Value._get_backward_func(Op.ADD, [self, other], out)
+        out = Value._wrap(self.data + other.data)
+        Value._add_to_graph(Op.ADD, [self, other], out)
         return out
-    
+
     def __radd__(self, other):
-        if isinstance(other, Number):
+        if not isinstance(other, Value):
             other = Value(other)
         return self.__add__(other)
 
     def __mul__(self, other):
-        if isinstance(other, Number):
+        if not isinstance(other, Value):
             other = Value(other)
-        out = Value(self.data * other.data)
-        out.children.update([self, other])
-        out._backward = Value._get_backward_func(Op.MUL, [self, other], out)
+        out = Value._wrap(self.data * other.data)
+        Value._add_to_graph(Op.MUL, [self, other], out)
         return out
 
     def __rmul__(self, other):
-        if isinstance(other, Number):
+        if not isinstance(other, Value):
             other = Value(other)
         return self.__mul__(other)
 
     def __truediv__(self, other):
-        if isinstance(other, Number):
+        if not isinstance(other, Value):
             other = Value(other)
         return self.__mul__(other**(-1))
 
     def __rtruediv__(self, other):
-        if isinstance(other, Number):
+        if not isinstance(other, Value):
             other = Value(other)
         return other.__truediv__(self)
 
     def __sub__(self, other):
-        if isinstance(other, Number):
+        if not isinstance(other, Value):
             other = Value(other)
         return self.__add__(-other)
-        
+
     def __rsub__(self, other):
-        if isinstance(other, Number):
+        if not isinstance(other, Value):
             other = Value(other)
         return other.__add__(-self)
 
     def __neg__(self):
-        out = Value(-self.data)
-        out.children.update([self])
-        out._backward = Value._get_backward_func(Op.NEG, [self], out)
+        out = Value._wrap(-self.data)
+        Value._add_to_graph(Op.NEG, [self], out)
         return out
 
     def __pow__(self, power):
-        out = Value(self.data ** power)
-        out.children.update([self])
-        out._backward = Value._get_backward_func(Op.POW, [self, power], out)
+        out = Value._wrap(self.data ** power)
+        Value._add_to_graph(Op.POW, [self, power], out)
         return out
-  
+
+    def __matmul__(self, other):
+        if not isinstance(other, Value):
+            other = Value(other)
+        out = Value._wrap(self.data @ other.data)
+        Value._add_to_graph(Op.MATMUL, [self, other], out)
+        return out
+
     def exp(self):
-        out = Value(np.exp(self.data))
-        out.children.update([self])
-        out._backward = Value._get_backward_func(Op.EXP, [self], out)
+        out = Value._wrap(np.exp(self.data))
+        Value._add_to_graph(Op.EXP, [self], out)
         return out
 
     def ln(self):
-        out = Value(np.log(self.data))
-        out.children.update([self])
-        out._backward = Value._get_backward_func(Op.LN, [self], out)
+        out = Value._wrap(np.log(self.data))
+        Value._add_to_graph(Op.LN, [self], out)
         return out
-    
+
+    def linear(self, W, b):
+        out = Value._wrap(self.data @ W.data + b.data)
+        Value._add_to_graph(Op.LINEAR, [self, W, b], out)
+        return out
+
+    def sigmoid(self):
+        out = Value._wrap(1 / (1 + np.exp(-self.data)))
+        Value._add_to_graph(Op.SIGMOID, [self], out)
+        return out
+
+    def softmax(self):
+        exp_X = np.exp(self.data - self.data.max(axis=-1, keepdims=True))
+        out = Value._wrap(exp_X / exp_X.sum(axis=-1, keepdims=True))
+        Value._add_to_graph(Op.SOFTMAX, [self], out)
+        return out
+
+    def log_softmax(self):
+        shifted_X = self.data - self.data.max(axis=-1, keepdims=True)
+        out = Value._wrap(shifted_X - np.log(np.exp(shifted_X).sum(axis=-1, keepdims=True)))
+        Value._add_to_graph(Op.LOG_SOFTMAX, [self], out)
+        return out
+
+    def layer_norm(self, scale, bias, epsilon):
+        centered = self.data - self.data.mean(axis=-1, keepdims=True)
+        norm_X = centered / np.sqrt((centered ** 2).mean(axis=-1, keepdims=True) + epsilon)
+        out = Value._wrap(norm_X * scale.data + bias.data)
+        Value._add_to_graph(Op.LAYER_NORM, [self, scale, bias, epsilon], out)
+        return out
+
+    @staticmethod
+    def add_n(values):
+        out = Value._wrap(sum([v.data for v in values]))
+        Value._add_to_graph(Op.SUM, list(values), out)
+        return out
+
+    @staticmethod
+    def dot(xs, ys):
+        out = Value._wrap(sum([np.vdot(x.data, y.data) for x, y in zip(xs, ys)]))
+        Value._add_to_graph(Op.DOT, [*xs, *ys], out)
+        return out
+
     def max(self, num):
         if isinstance(num, Number):
-            out = Value(self.data if self.data >= num else num)
-            out.children.update([self])
-            out._backward = Value._get_backward_func(Op.MAX, [self, num], out)
+            out = Value._wrap(np.maximum(self.data, num))
+            Value._add_to_graph(Op.MAX, [self, num], out)
         return out
-    
+
     def min(self, num):
         if isinstance(num, Number):
-            out = Value(self.data if self.data <= num else num)
-            out.children.update([self])
-            out._backward = Value._get_backward_func(Op.MIN, [self, num], out)
+            out = Value._wrap(np.minimum(self.data, num))
+            Value._add_to_graph(Op.MIN, [self, num], out)
+        return out
+
+    def sum(self, axis=None):
+        out = Value._wrap(self.data.sum(axis=axis))
+        Value._add_to_graph(Op.AXIS_SUM, [self, axis], out)
+        return out
+
+    def reshape(self, *shape):
+        out = Value._wrap(self.data.reshape(*shape))
+        Value._add_to_graph(Op.RESHAPE, [self], out)
         return out
 
     def __lt__(self, num):
         if isinstance(num, Number):
             return self.data < num
-            
+
     def __gt__(self, num):
         if isinstance(num, Number):
             return self.data > num
@@ -139,15 +233,46 @@ class Value:
     def zero_grad(self):
         self.grad = 0
 
+    @staticmethod
+    def _unbroadcast(grad, shape):
+        if isinstance(grad, RowGrad):
+            return grad
+        grad = np.asarray(grad)
+        if grad.shape == shape:
+            return grad
+        if grad.ndim < len(shape):
+            return np.broadcast_to(grad, shape)
+        grad = grad.sum(axis=tuple(range(grad.ndim - len(shape))))
+        axes = tuple(i for i, dim in enumerate(shape) if dim == 1 and grad.shape[i] != 1)
+        return grad.sum(axis=axes, keepdims=True) if axes else grad
+
+    @staticmethod
+    def _propagate(rules, in_vars, out_var):
+        for rule, in_var in zip(rules, in_vars):
+            if rule is not None:
+                in_var.grad += Value._unbroadcast(rule(in_vars, out_var), in_var.data.shape)
+
     @staticmethod
     def _get_backward_func(op, in_vars, out_var):
-        derivative = Derivative(op, in_vars, out_var)
+        rules = Derivative.rules(op, len(in_vars))
         def _backward():
-            for in_var in in_vars:
-                if isinstance(in_var, Value):
-                    in_var.grad += derivative(in_var)
+            Value._propagate(rules, in_vars, out_var)
         return _backward
 
+    @staticmethod
+    def _add_to_graph(op, in_vars, out_var):
+        if not GradMode.enabled:
+            return
+        if Value._tape is not None:
+            Value._tape.record(op, in_vars, out_var)
+        else:
+            out_var.children.update(in_var for in_var in in_vars if isinstance(in_var, Value))
+            out_var._backward = Value._get_backward_func(op, in_vars, out_var)
+
+    @staticmethod
+    def use_tape(enabled=True):
+        Value._tape = Tape(Value, Value._propagate, sweep_size=64) if enabled else None
+
     def _get_reverse_topologically_ordered_all_descendats(self):
         ordered, visited = [], set()
         stack = [(self, False)]
@@ -161,10 +286,25 @@ class Value:
                     stack.append((value, True))
                     for child in value.children:
                         stack.append((child, False))
-        return reversed(ordered)
+        return ordered[::-1]
+
+    def _release(self):
+        self.children = set()
+        self._backward = lambda: 0
+        self._backprop_order_cache = None
 
-    def backward(self):
-        if self._backprop_order_cache is None:
-            self._backprop_order_cache = self._get_reverse_topologically_ordered_all_descendats()
-        for descendant in self._backprop_order_cache:
+    def backward(self, retain_graph=False):
+        if Value._tape is not None:
+            Value._tape.backward(self, retain_graph)
+            return
+        ordered_descendants = self._backprop_order_cache
+        if ordered_descendants is None:
+            ordered_descendants = self._get_reverse_topologically_ordered_all_descendats()
+        self._backprop_order_cache = ordered_descendants if retain_graph else None
+        for descendant in ordered_descendants:
+            if descendant.children and descendant is not self:
+                descendant.grad = 0
+        for descendant in ordered_descendants:
             descendant._backward()
+            if not retain_graph:
+                descendant._release()
@@ -1,67 +1,155 @@
+import numpy as np
+
+from lib.calculus import RowGrad
+
 EPSILON = 1e-8
 
 class SgdOptimizer:
+    """Vectorized updates over flat data, gradient and state buffers."""
+
     def __init__(self, nn, learning_rate):
-        self.all_values = [v for p in nn.params() for v in p.all_values()]
+        self.params = list(nn.params())
+        self.all_values = [v for p in self.params for v in p.all_values()]
         self.learning_rate = learning_rate
 
+        offsets = np.cumsum([0] + [np.size(v.data) for v in self.all_values])
+        self.bounds = list(zip(offsets[:-1].tolist(), offsets[1:].tolist()))
+        self.data = np.zeros(offsets[-1])
+        self.grads = np.zeros(offsets[-1])
+        self.has_array_values = any(isinstance(v.data, np.ndarray) for v in self.all_values)
+
+        value_offsets = np.cumsum([0] + [len(p.all_values()) for p in self.params]).tolist()
+        self.value_ranges = list(zip(value_offsets[:-1], value_offsets[1:]))
+        self.dense_values = [v for p, (start, end) in zip(self.params, self.value_ranges)
+                             if not hasattr(p, "grad_rows") for v in self.all_values[start:end]]
+
     def step(self, loss):
-        for v in self.all_values:
+        for v in self.dense_values:
             v.zero_grad()
+        for p_idx, p in enumerate(self.params):
+            if hasattr(p, "grad_rows"):
+                for v_idx in self._row_indexes(p_idx, np.fromiter(p.grad_rows, dtype=int)).tolist():
+                    self.all_values[v_idx].zero_grad()
+                p.grad_rows.clear()
 
         loss.grad = 1
         loss.backward()
         self._update_grads()
 
+    def _grad_rows(self, p):
+        """Sorted rows of `p` to update, None when the whole parameter is."""
+        if isinstance(getattr(p, "grad", None), RowGrad):
+            p.grad = p.grad.coalesce()
+            return p.grad.rows
+        if hasattr(p, "grad_rows"):
+            return np.sort(np.fromiter(p.grad_rows, dtype=int))
+        return None
+
+    def _row_indexes(self, p_idx, rows):
+        start, end = self.bounds[self.value_ranges[p_idx][0]][0], self.bounds[self.value_ranges[p_idx][1] - 1][1]
+        row_size = (end - start) // self.params[p_idx].dims()[0]
+        return (start + rows[:, None] * row_size + np.arange(row_size)).reshape(-1)
+
+    def _gather_array_value(self, v, start, end):
+        if v.data.base is not self.data:
+            self.data[start:end] = np.ravel(v.data)
+            v.data = self.data[start:end].reshape(v.data.shape)
+
+    def _gather(self):
+        """Fills the flat buffers; returns the flat indexes to update (a slice if all) and their gradients."""
+        all_rows = [self._grad_rows(p) for p in self.params]
+        if all(rows is None for rows in all_rows):
+            if self.has_array_values:
+                for v, (start, end) in zip(self.all_values, self.bounds):
+                    self._gather_array_value(v, start, end)
+                    self.grads[start:end] = np.ravel(v.grad)
+            else:
+                self.data[:] = [v.data for v in self.all_values]
+                self.grads[:] = [v.grad for v in self.all_values]
+            return slice(None), self.grads
+
+        idxs = []
+        for p_idx, (p, rows) in enumerate(zip(self.params, all_rows)):
+            value_start, value_end = self.value_ranges[p_idx]
+            if rows is None:
+                idx = np.arange(self.bounds[value_start][0], self.bounds[value_end - 1][1])
+            else:
+                idx = self._row_indexes(p_idx, rows)
+            if self.has_array_values:
+                for v, (start, end) in zip(self.all_values[value_start:value_end], self.bounds[value_start:value_end]):
+                    self._gather_array_value(v, start, end)
+                    if rows is None:
+                        self.grads[start:end] = np.ravel(v.grad)
+                if rows is not None:
+                    self.grads[idx] = np.ravel(p.grad.values)
+            else:
+                values = [self.all_values[v_idx] for v_idx in idx.tolist()]
+                self.data[idx] = [v.data for v in values]
+                self.grads[idx] = [v.grad for v in values]
+            idxs.append(idx)
+        idx = np.concatenate(idxs)
+        return idx, self.grads[idx]
+
+    def _scatter(self, idx):
+        if not self.has_array_values:
+            values = self.all_values if isinstance(idx, slice) else [self.all_values[v_idx] for v_idx in idx.tolist()]
+            for v, data in zip(values, self.data[idx].tolist()):
+                v.data = data
+
     def _update_grads(self):
-        for v in self.all_values:
-            v.data -= self.learning_rate * v.grad
+        idx, grads = self._gather()
+        self.data[idx] -= self.learning_rate * grads
+        self._scatter(idx)
 
 
 class SgdWithMomentumOptimizer(SgdOptimizer):
     def __init__(self, nn, learning_rate, momentum_coef):
         super().__init__(nn, learning_rate)
         self.momentum_coef = momentum_coef
-        self.grad_accums = [0 for _ in range(len(self.all_values))]
+        self.grad_accums = np.zeros_like(self.data)
 
     def _update_grads(self):
-        for idx, v in enumerate(self.all_values):
-            self.grad_accums[idx] = self.momentum_coef * self.grad_accums[idx] + (1 - self.momentum_coef) * v.grad
-            v.data -= self.learning_rate * self.grad_accums[idx]
+        idx, grads = self._gather()
+        grad_accums = self.grad_accums[idx] = self.momentum_coef * self.grad_accums[idx] + (1 - self.momentum_coef) * grads
+        self.data[idx] -= self.learning_rate * grad_accums
+        self._scatter(idx)
 
 
 class AdaGradOptimizer(SgdOptimizer):
     def __init__(self, nn, learning_rate):
         super().__init__(nn, learning_rate)
-        self.grad_accums = [0 for _ in range(len(self.all_values))]
+        self.grad_accums = np.zeros_like(self.data)
 
     def _update_grads(self):
-        for idx, v in enumerate(self.all_values):
-            self.grad_accums[idx] +=  v.grad ** 2
-            v.data -= self.learning_rate * v.grad / (self.grad_accums[idx] + EPSILON) ** 0.5
+        idx, grads = self._gather()
+        grad_accums = self.grad_accums[idx] = self.grad_accums[idx] + grads ** 2
+        self.data[idx] -= self.learning_rate * grads / np.sqrt(grad_accums + EPSILON)
+        self._scatter(idx)
 
 
 class RmsPropOptimizer(SgdWithMomentumOptimizer):
     def _update_grads(self):
-        for idx, v in enumerate(self.all_values):
-            self.grad_accums[idx] = self.momentum_coef * self.grad_accums[idx] + (1 - self.momentum_coef) * v.grad ** 2
-            v.data -= self.learning_rate * v.grad / (self.grad_accums[idx] + EPSILON) ** 0.5
+        idx, grads = self._gather()
+        grad_accums = self.grad_accums[idx] = self.momentum_coef * self.grad_accums[idx] + (1 - self.momentum_coef) * grads ** 2
+        self.data[idx] -= self.learning_rate * grads / np.sqrt(grad_accums + EPSILON)
+        self._scatter(idx)
 
 
-class AdamOptimizer(SgdOptimizer):    
+class AdamOptimizer(SgdOptimizer):
     def __init__(self, nn, learning_rate, momentum_coef1, momentum_coef2):
         super().__init__(nn, learning_rate)
-        self.grad_accums1 = [0 for _ in range(len(self.all_values))]
-        self.grad_accums2 = [0 for _ in range(len(self.all_values))]
+        self.grad_accums1 = np.zeros_like(self.data)
+        self.grad_accums2 = np.zeros_like(self.data)
         self.momentum_coef1 = momentum_coef1
         self.momentum_coef2 = momentum_coef2
         self.time = 1
 
     def _update_grads(self):
-        for idx, v in enumerate(self.all_values):
-            self.grad_accums1[idx] = self.momentum_coef1 * self.grad_accums1[idx] + (1 - self.momentum_coef1) * v.grad
-            self.grad_accums2[idx] = self.momentum_coef2 * self.grad_accums2[idx] + (1 - self.momentum_coef2) * v.grad**2
-            m_norm = self.grad_accums1[idx] / (1 - self.momentum_coef1 ** self.time)
-            v_norm = self.grad_accums2[idx] / (1 - self.momentum_coef2 ** self.time)
-            v.data -= self.learning_rate * m_norm / (v_norm ** 0.5 + EPSILON)
+        idx, grads = self._gather()
+        grad_accums1 = self.grad_accums1[idx] = self.momentum_coef1 * self.grad_accums1[idx] + (1 - self.momentum_coef1) * grads
+        grad_accums2 = self.grad_accums2[idx] = self.momentum_coef2 * self.grad_accums2[idx] + (1 - self.momentum_coef2) * grads ** 2
+        m_norm = grad_accums1 / (1 - self.momentum_coef1 ** self.time)
+        v_norm = grad_accums2 / (1 - self.momentum_coef2 ** self.time)
+        self.data[idx] -= self.learning_rate * m_norm / (np.sqrt(v_norm) + EPSILON)
+        self._scatter(idx)
         self.time += 1
@@ -1,5 +1,8 @@
 from numbers import Number
 
+import numpy as np
+
+from lib.calculus import GradMode
 from lib.original_backend.value import Value
 
 
@@ -48,29 +51,32 @@ class Vector:
         return len(self.values)
 
     def sum(self):
-        return sum(self.values)
+        return Value.add_n(self.values)
 
     def mean(self):
-        return (sum(self.values)/self.dim())
+        return self.sum() / self.dim()
 
     def __neg__(self):
         return Vector([-v for v in self.values])
 
     def var(self):
         mean = self.mean()
-        return sum([(v - mean)**2 for v in self.values]) / self.dim()
+        centered = [v - mean for v in self.values]
+        return Value.dot(centered, centered) / self.dim()
 
     def std(self):
         return self.var() ** (1/2)
         
     def dotprod(self, other):
-        return sum(self * other)
+        return Value.dot(self.values, other.values)
 
     def all_values(self):
         return self.values
 
 
 class Matrix:
+    MATMUL_BLOCK_SIZE = 32
+
     def __init__(self, values):
         are_value_types = isinstance(values[0][0], Value)
         if are_value_types:
@@ -197,6 +203,20 @@ class Matrix:
 
     def rows(self, keys):
         return Matrix([self.values[int(key.data) if isinstance(key, Value) else key] for key in keys])
+
+    def gather_rows(self, keys):
+        if not GradMode.enabled:
+            return self.rows(keys)
+        rows = [int(key.data) if isinstance(key, Value) else key for key in keys]
+        return Matrix([[v.row_lookup(self.grad_rows, row) for v in self.values[row]] for row in rows])
+
+    def to_array(self):
+        """Returns the matrix as a 2D object array holding its own Values, for index based row gathers."""
+        return np.array(self.values, dtype=object)
+
+    @staticmethod
+    def from_array(array):
+        return Matrix(array.tolist())
         
     def col(self, key):
         col = []
@@ -207,14 +227,13 @@ class Matrix:
     def row_sum(self):
         row_sum = []
         for row in self.values:
-            row_sum.append(sum(row))
+            row_sum.append(Value.add_n(row))
         return Vector(row_sum)
      
     def col_sum(self):
-        col_sum = [0] * self.dims()[1]
-        for i in range(self.dims()[1]):
-            for row in self.values:
-                col_sum[i]+=row[i]
+        col_sum = []
+        for col in zip(*self.values):
+            col_sum.append(Value.add_n(col))
         return Vector(col_sum)
 
     @staticmethod
@@ -229,14 +248,15 @@ class Matrix:
 
     def matmul(self, other):
         assert self.dims()[1] == other.dims()[0], f"Trying to multiply matrices of dims {self.dims()} and {other.dims()}"
-        result = []
-        for sri in range(len(self.values)):
-            row = []
-            for oci in range(len(other.values[0])):
-                self_row = self.values[sri]
-                other_col = [r[oci] for r in other.values]
-                row.append(sum([vr * vo for vr, vo in zip(self_row, other_col)]))
-            result.append(row)
+        rows_len, cols_len = self.dims()[0], other.dims()[1]
+        other_cols = [list(col) for col in zip(*other.values)]
+        result = [[None] * cols_len for _ in range(rows_len)]
+        for row_block in range(0, rows_len, self.MATMUL_BLOCK_SIZE):
+            for col_block in range(0, cols_len, self.MATMUL_BLOCK_SIZE):
+                for sri in range(row_block, min(row_block + self.MATMUL_BLOCK_SIZE, rows_len)):
+                    self_row, result_row = self.values[sri], result[sri]
+                    for oci in range(col_block, min(col_block + self.MATMUL_BLOCK_SIZE, cols_len)):
+                        result_row[oci] = Value.dot(self_row, other_cols[oci])
         return Matrix(result)
 
 
@@ -1,5 +1,6 @@
 import numpy as np
 
+from lib.calculus import no_grad
 from lib.original_backend.linear_algebra import Vector, Matrix, Tensor3D
 
 EPSILON = 1e-5
@@ -49,12 +50,20 @@ class Softmax(Layer):
         return exp_X / (Matrix.broadcast(exp_X.row_sum(), X.dims()[1]) + EPSILON)
 
 
+class LogSoftmax(Layer):
+    def forward(self, X):
+        shifted_X = X - Matrix.broadcast(Vector([max(v.data for v in row) for row in X]), X.dims()[1])
+        log_sum_exp_X = Vector([v.ln() for v in shifted_X.exp().row_sum()])
+        return shifted_X - Matrix.broadcast(log_sum_exp_X, X.dims()[1])
+
+
 class Embedding(Layer):
     def __init__(self, vocab_size, emb_dim):
         self.embedding = Matrix(np.random.normal(size=(vocab_size, emb_dim)))
+        self.embedding.grad_rows = set()
 
     def forward(self, X):
-        out = Tensor3D([self.embedding.rows(seq) for seq in X])
+        out = Tensor3D([self.embedding.gather_rows(seq) for seq in X])
         return out
 
     def params(self):
@@ -118,6 +127,10 @@ class NN:
             X = l(X)
         return X
 
+    def predict(self, X):
+        with no_grad():
+            return self.forward(X)
+
     def params(self):
         params = []
         for l in self.layers:
@@ -1,52 +1,17 @@
-from lib.original_backend.value import Value
+from lib import processing
 from lib.original_backend.linear_algebra import Matrix, Vector
 
 
-class OneHotEncoder:
-    def __init__(self):
-        self.categories = []
-
-    def fit(self, vector):
-        for v in vector:
-            if v not in self.categories:
-                self.categories.append(v)
-
+class OneHotEncoder(processing.OneHotEncoder):
     def transform(self, vector):
-        result = []
-        for v in vector:
-            result.append([int(v == c) for c in self.categories])
-
-        return Matrix(result)
+        return Matrix(self.transform_array(vector).tolist())
 
 
-class ColumnNormalizer:
-    def __init__(self):
-        self.means = []
-        self.stds = []
-
-    def fit(self, matrix):     
-        for col in range(matrix.dims()[1]):
-            self.means.append(matrix.col(col).mean())
-            self.stds.append(matrix.col(col).std())
-            
+class ColumnNormalizer(processing.ColumnNormalizer):
     def transform(self, matrix):
-        result = []
-        for col in range(matrix.dims()[1]):
-            for idx, v in enumerate(matrix.col(col)):
-                if len(result) <= idx:
-                    result.append([])
-                result[idx].append(Value((v.data - self.means[col].data) / self.stds[col].data))
-        return Matrix(result)
-
-
-class LabelEncoder:
-    def __init__(self):
-        self.categories = []
+        return Matrix(self.transform_array(matrix).tolist())
 
-    def fit(self, vector):
-        for v in vector:
-            if v not in self.categories:
-                self.categories.append(v)
 
+class LabelEncoder(processing.LabelEncoder):
     def transform(self, vector):
-        return Vector([self.categories.index(v) for v in vector])
+        return Vector(self.transform_array(vector).tolist())
@@ -1,37 +1,48 @@
+from itertools import count
 from numbers import Number
-from uuid import uuid4
 
 import numpy as np
 
-from lib.calculus import Derivative, Op
+from lib.calculus import Derivative, GradMode, Op, Tape
+
+
+def _no_backward():
+    return 0
 
 
 class Value:
-    __slots__ = ("data", "grad", "children", "_backward", "_id")
+    __slots__ = ("data", "grad", "children", "_backward", "_id", "_tape_id", "__weakref__")
+
+    _tape = None
+    _ids = count()
+    _lazy_loads = {
+        "grad": int,
+        "children": set,
+        "_backward": lambda: _no_backward,
+        "_tape_id": lambda: None,
+    }
 
     def __init__(self, data):
         self.data = data
-        self._id = uuid4()
+        self._id = next(Value._ids)
 
     def __getattr__(self, name):
-        lazy_loads = {
-            "grad": 0,
-            "children": set(),
-            "_backward": lambda: 0,
-        }
-        setattr(self, name, lazy_loads[name])
-        return lazy_loads[name]
+        lazy_load = Value._lazy_loads.get(name)
+        if lazy_load is None:
+            raise AttributeError(name)
+        value = lazy_load()
+        setattr(self, name, value)
+        return value
 
     def __str__(self):
-        return str(f"{{{str(self._id)[:8]}, {round(self.data, 2)}, {round(self.grad, 2)}}}")
+        return str(f"{{{self._id}, {round(self.data, 2)}, {round(self.grad, 2)}}}")
 
     def __repr__(self):
         return str(self)
 
     def __mul__(self, other):
         out = Value(self.data * other.data)
-        out.children.update([self, other])
-        out._backward = Value._get_backward_func(Op.MUL, [self, other], out)
+        Value._add_to_graph(Op.MUL, [self, other], out)
         return out
 
     def __truediv__(self, other):
@@ -45,8 +56,7 @@ class Value:
 
     def __add__(self, other):
         out = Value(self.data + other.data)
-        out.children.update([self, other])
-        out._backward = Value._get_backward_func(Op.ADD, [self, other], out)
+        Value._add_to_graph(Op.ADD, [self, other], out)
         return out
     
     def __radd__(self, other):
@@ -60,40 +70,46 @@ class Value:
           
     def __neg__(self):
         out = Value(-self.data)
-        out.children.update([self])
-        out._backward = Value._get_backward_func(Op.NEG, [self], out)
+        Value._add_to_graph(Op.NEG, [self], out)
         return out
 
     def __pow__(self, power):
         out = Value(self.data ** power)
-        out.children.update([self])
-        out._backward = Value._get_backward_func(Op.POW, [self, power], out)
+        Value._add_to_graph(Op.POW, [self, power], out)
         return out
   
     def exp(self):
         out = Value(np.exp(self.data))
-        out.children.update([self])
-        out._backward = Value._get_backward_func(Op.EXP, [self], out)
+        Value._add_to_graph(Op.EXP, [self], out)
         return out
 
     def ln(self):
         out = Value(np.log(self.data))
-        out.children.update([self])
-        out._backward = Value._get_backward_func(Op.LN, [self], out)
+        Value._add_to_graph(Op.LN, [self], out)
         return out
     
+    @staticmethod
+    def add_n(values):
+        out = Value(sum([v.data for v in values]))
+        Value._add_to_graph(Op.SUM, list(values), out)
+        return out
+
+    @staticmethod
+    def dot(xs, ys):
+        out = Value(sum([x.data * y.data for x, y in zip(xs, ys)]))
+        Value._add_to_graph(Op.DOT, [*xs, *ys], out)
+        return out
+
     def max(self, num):
         if isinstance(num, Number):
             out = Value(self.data if self.data >= num else num)
-            out.children.update([self])
-            out._backward = Value._get_backward_func(Op.MAX, [self, num], out)
+            Value._add_to_graph(Op.MAX, [self, num], out)
         return out
     
     def min(self, num):
         if isinstance(num, Number):
             out = Value(self.data if self.data <= num else num)
-            out.children.update([self])
-            out._backward = Value._get_backward_func(Op.MIN, [self, num], out)
+            Value._add_to_graph(Op.MIN, [self, num], out)
         return out
 
     def __lt__(self, num):
@@ -108,20 +124,43 @@ class Value:
         return isinstance(other, Value) and self._id == other._id
 
     def __hash__(self):
-        return hash(self._id)
+        return self._id
+
+    def row_lookup(self, grad_rows, row):
+        out = Value(self.data)
+        Value._add_to_graph(Op.ROW_LOOKUP, [self, grad_rows, row], out)
+        return out
 
     def zero_grad(self):
         self.grad = 0
 
+    @staticmethod
+    def _propagate(rules, in_vars, out_var):
+        for rule, in_var in zip(rules, in_vars):
+            if rule is not None:
+                in_var.grad += rule(in_vars, out_var)
+
     @staticmethod
     def _get_backward_func(op, in_vars, out_var):
-        derivative = Derivative(op, in_vars, out_var)
+        rules = Derivative.rules(op, len(in_vars))
         def _backward():
-            for in_var in in_vars:
-                if isinstance(in_var, Value):
-                    in_var.grad += derivative(in_var)
+            Value._propagate(rules, in_vars, out_var)
         return _backward
 
+    @staticmethod
+    def _add_to_graph(op, in_vars, out_var):
+        if not GradMode.enabled:
+            return
+        if Value._tape is not None:
+            Value._tape.record(op, in_vars, out_var)
+        else:
+            out_var.children.update(in_var for in_var in in_vars if isinstance(in_var, Value))
+            out_var._backward = Value._get_backward_func(op, in_vars, out_var)
+
+    @staticmethod
+    def use_tape(enabled=True):
+        Value._tape = Tape(Value, Value._propagate) if enabled else None
+
     def _get_reverse_topologically_ordered_all_descendats(self):
         ordered, visited = [], set()
         stack = [(self, False)]
@@ -137,7 +176,19 @@ class Value:
                         stack.append((child, False))
         return reversed(ordered)
 
-    def backward(self):
-        ordered_descendants = self._get_reverse_topologically_ordered_all_descendats()
+    def _release(self):
+        self.children = set()
+        self._backward = _no_backward
+
+    def backward(self, retain_graph=False):
+        if Value._tape is not None:
+            Value._tape.backward(self, retain_graph)
+            return
+        ordered_descendants = list(self._get_reverse_topologically_ordered_all_descendats())
+        for descendant in ordered_descendants:
+            if descendant.children and descendant is not self:
+                descendant.grad = 0
         for descendant in ordered_descendants:
             descendant._backward()
+            if not retain_graph:
+                descendant._release()
@@ -0,0 +1,14 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def map_chunks(func, chunks, workers, initializer=None, initargs=()):
+    """Yields func(chunk) in order, computed in a process pool with at most two chunks per worker in flight."""
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,155 @@
+import numpy as np
+
+
+def as_array(values):
+    """Converts a list, array or backend Vector/Matrix to a NumPy array, reading `.data` out of graph Values."""
+    if hasattr(values, "to_array"):
+        array = np.asarray(values.to_array())
+    elif hasattr(values, "__array__"):
+        array = np.asarray(values)
+    else:
+        array = np.asarray(list(values))
+    if array.dtype == object and array.size and hasattr(array.flat[0], "data"):
+        array = np.vectorize(lambda v: v.data, otypes=[float])(array)
+    return array
+
+
+def as_list(values):
+    return values if isinstance(values, list) else as_array(values).reshape(-1).tolist()
+
+
+def _as_category_array(values):
+    """Flat NumPy array of the values, None for lists and object arrays (mixed types), kept as Python objects."""
+    if isinstance(values, list):
+        return None
+    array = as_array(values).reshape(-1)
+    return None if array.dtype == object else array
+
+
+class CategoryEncoder:
+    """Categories kept in first seen order; fitted chunk by chunk with `partial_fit` and `merge`."""
+
+    def __init__(self):
+        self.categories = []
+        self.category_ids = {}
+        self._category_lookup = None
+
+    def fit(self, vector):
+        self.categories = []
+        self.category_ids = {}
+        self._category_lookup = None
+        self.partial_fit(vector)
+
+    def partial_fit(self, vector):
+        array = _as_category_array(vector)
+        if array is None:
+            self._add_categories(dict.fromkeys(as_list(vector)))
+        else:
+            uniques, first_idxs = np.unique(array, return_index=True)
+            self._add_categories(uniques[np.argsort(first_idxs)].tolist())
+
+    def merge(self, other):
+        self._add_categories(other.categories)
+
+    def _add_categories(self, categories):
+        self._category_lookup = None
+        for category in categories:
+            if category not in self.category_ids:
+                self.category_ids[category] = len(self.categories)
+                self.categories.append(category)
+
+    MAX_CODE_TABLE_SIZE = 1 << 20
+
+    def _category_index(self):
+        """Cached code lookup table (integers) or sorted categories (other numbers, str), None for mixed types."""
+        if self._category_lookup is None:
+            categories = np.array(self.categories)
+            self._category_lookup = False
+            if self.categories and categories.dtype.kind in "biufU" and categories.tolist() == self.categories:
+                low = categories.min() if categories.dtype.kind in "iu" else 0
+                if categories.dtype.kind in "iu" and categories.max() - low < self.MAX_CODE_TABLE_SIZE:
+                    table = np.full(categories.max() - low + 1, -1)
+                    table[categories - low] = np.arange(len(categories))
+                    self._category_lookup = "table", low, table
+                else:
+                    order = np.argsort(categories, kind="stable")
+                    self._category_lookup = "sorted", categories[order], order
+        return self._category_lookup or None
+
+    def codes(self, vector):
+        """Category index of every value as an int array, -1 for values not seen during fit."""
+        get_id = self.category_ids.get
+        array = _as_category_array(vector)
+        if array is None:
+            values = as_list(vector)
+            return np.fromiter((get_id(v, -1) for v in values), dtype=int, count=len(values))
+        index = self._category_index()
+        if index is not None and index[0] == "table" and array.dtype.kind in "iu":
+            _, low, table = index
+            positions = array - low
+            known = (positions >= 0) & (positions < len(table))
+            return np.where(known, table[np.where(known, positions, 0)], -1)
+        if index is not None and index[0] == "sorted" and (array.dtype.kind == "U") == (index[1].dtype.kind == "U"):
+            _, sorted_categories, category_codes = index
+            positions = np.searchsorted(sorted_categories, array).clip(max=len(sorted_categories) - 1)
+            return np.where(sorted_categories[positions] == array, category_codes[positions], -1)
+        uniques, inverse = np.unique(array, return_inverse=True)
+        unique_codes = np.fromiter((get_id(v, -1) for v in uniques.tolist()), dtype=int, count=len(uniques))
+        return unique_codes[inverse.reshape(-1)]
+
+
+class OneHotEncoder(CategoryEncoder):
+    def transform_array(self, vector):
+        codes = self.codes(vector)
+        one_hot = np.zeros((len(codes), len(self.categories)), dtype=int)
+        known = codes != -1
+        one_hot[np.flatnonzero(known), codes[known]] = 1
+        return one_hot
+
+
+class LabelEncoder(CategoryEncoder):
+    def transform_array(self, vector):
+        codes = self.codes(vector)
+        if (codes == -1).any():
+            raise ValueError(f"{as_list(vector)[np.flatnonzero(codes == -1)[0]]} is not in categories")
+        return codes
+
+
+class ColumnNormalizer:
+    """Per column mean and std from running statistics; fitted chunk by chunk with `partial_fit` and `merge`."""
+
+    DDOF = 0
+
+    def __init__(self):
+        self.count = 0
+        self.means = None
+        self.m2 = None
+        self.stds = None
+
+    def fit(self, matrix):
+        self.count = 0
+        self.partial_fit(matrix)
+
+    def partial_fit(self, matrix):
+        data = as_array(matrix).astype(np.float64)
+        means = data.mean(axis=0)
+        self._merge_stats(len(data), means, ((data - means) ** 2).sum(axis=0))
+
+    def merge(self, other):
+        self._merge_stats(other.count, other.means, other.m2)
+
+    def _merge_stats(self, count, means, m2):
+        if count == 0:
+            return
+        if self.count == 0:
+            self.count, self.means, self.m2 = count, means.copy(), m2.copy()
+        else:
+            total_count = self.count + count
+            delta = means - self.means
+            self.means = self.means + delta * count / total_count
+            self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total_count
+            self.count = total_count
+        self.stds = np.sqrt(self.m2 / (self.count - self.DDOF))
+
+    def transform_array(self, matrix):
+        return (as_array(matrix) - self.means) / self.stds
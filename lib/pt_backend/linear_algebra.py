@@ -1,5 +1,5 @@
 import numpy as np
-from torch import Tensor, log
+from torch import Tensor, from_numpy, get_default_dtype, log
 
 
 class Matrix(Tensor):
@@ -18,6 +18,13 @@ class Matrix(Tensor):
     def col(self, key):
         return Tensor(self[:, key])
 
+    def to_array(self):
+        return self.detach().numpy()
+
+    @staticmethod
+    def from_array(array):
+        return from_numpy(np.ascontiguousarray(array)).to(get_default_dtype()).as_subclass(Matrix)
+
     def row_sum(self):
         return Tensor(self.sum(1))
      
@@ -39,6 +39,15 @@ class Softmax(nn.Module):
         return exp_X / (torch.sum(exp_X, dim=self.dim, keepdim=True) + EPSILON)
 
 
+class LogSoftmax(nn.Module):
+    def __init__(self, dim=1):
+        super().__init__()
+        self.dim = dim
+
+    def forward(self, X):
+        return F.log_softmax(X, dim=self.dim)
+
+
 class Embedding(nn.Module):
     def __init__(self, vocab_size, emb_dim):
         super().__init__()
@@ -81,5 +90,9 @@ class NN(nn.Module):
             X = layer(X)
         return X
 
+    def predict(self, X):
+        with torch.no_grad():
+            return self.forward(X)
+
     def params(self):
         return self.parameters()
@@ -3,6 +3,8 @@ import torch
 EPSILON = 1e-8
 
 class SgdOptimizer:
+    """Updates all parameters with in-place `torch._foreach_*` ops, skipping those without grad."""
+
     def __init__(self, nn, learning_rate):
         self.params = list(nn.params())
         self.learning_rate = learning_rate
@@ -14,9 +16,14 @@ class SgdOptimizer:
         loss.backward()
         self._update_grads()
 
+    def _with_grads(self, *states):
+        idxs = [idx for idx, p in enumerate(self.params) if p.grad is not None]
+        return [self.params[idx].data for idx in idxs], [self.params[idx].grad for idx in idxs], *[[state[idx] for idx in idxs] for state in states]
+
+    @torch.no_grad()
     def _update_grads(self):
-        for p in self.params:
-            p.data -= self.learning_rate * p.grad
+        datas, grads = self._with_grads()
+        torch._foreach_sub_(datas, torch._foreach_mul(grads, self.learning_rate))
 
 class SgdWithMomentumOptimizer(SgdOptimizer):
     def __init__(self, nn, learning_rate, momentum_coef):
@@ -24,10 +31,12 @@ class SgdWithMomentumOptimizer(SgdOptimizer):
         self.momentum_coef = momentum_coef
         self.grad_accums = [torch.zeros(p.shape) for p in self.params]
 
+    @torch.no_grad()
     def _update_grads(self):
-        for idx, p in enumerate(self.params):
-            self.grad_accums[idx] = self.momentum_coef * self.grad_accums[idx] + (1 - self.momentum_coef) * p.grad
-            p.data -= self.learning_rate * self.grad_accums[idx]
+        datas, grads, grad_accums = self._with_grads(self.grad_accums)
+        torch._foreach_mul_(grad_accums, self.momentum_coef)
+        torch._foreach_add_(grad_accums, torch._foreach_mul(grads, 1 - self.momentum_coef))
+        torch._foreach_sub_(datas, torch._foreach_mul(grad_accums, self.learning_rate))
 
 
 class AdaGradOptimizer(SgdOptimizer):
@@ -35,20 +44,33 @@ class AdaGradOptimizer(SgdOptimizer):
         super().__init__(nn, learning_rate)
         self.grad_accums = [torch.zeros(p.shape) for p in self.params]
 
+    @torch.no_grad()
     def _update_grads(self):
-        for idx, p in enumerate(self.params):
-            self.grad_accums[idx] += p.grad ** 2
-            p.data -= self.learning_rate * p.grad / (self.grad_accums[idx] + EPSILON) ** 0.5
+        datas, grads, grad_accums = self._with_grads(self.grad_accums)
+        torch._foreach_add_(grad_accums, torch._foreach_mul(grads, grads))
+        denoms = torch._foreach_add(grad_accums, EPSILON)
+        torch._foreach_sqrt_(denoms)
+        updates = torch._foreach_mul(grads, self.learning_rate)
+        torch._foreach_div_(updates, denoms)
+        torch._foreach_sub_(datas, updates)
 
 
 class RmsPropOptimizer(SgdWithMomentumOptimizer):
+    @torch.no_grad()
     def _update_grads(self):
-        for idx, p in enumerate(self.params):
-            self.grad_accums[idx] = self.momentum_coef * self.grad_accums[idx] + (1 - self.momentum_coef) * p.grad ** 2
-            p.data -= self.learning_rate * p.grad / (self.grad_accums[idx] + EPSILON) ** 0.5
+        datas, grads, grad_accums = self._with_grads(self.grad_accums)
+        torch._foreach_mul_(grad_accums, self.momentum_coef)
+        squared_grads = torch._foreach_mul(grads, grads)
+        torch._foreach_mul_(squared_grads, 1 - self.momentum_coef)
+        torch._foreach_add_(grad_accums, squared_grads)
+        denoms = torch._foreach_add(grad_accums, EPSILON)
+        torch._foreach_sqrt_(denoms)
+        updates = torch._foreach_mul(grads, self.learning_rate)
+        torch._foreach_div_(updates, denoms)
+        torch._foreach_sub_(datas, updates)
 
 
-class AdamOptimizer(SgdOptimizer):    
+class AdamOptimizer(SgdOptimizer):
     def __init__(self, nn, learning_rate, momentum_coef1, momentum_coef2):
         super().__init__(nn, learning_rate)
         self.grad_accums1 = [torch.zeros(p.shape) for p in self.params]
@@ -57,11 +79,21 @@ class AdamOptimizer(SgdOptimizer):
         self.momentum_coef2 = momentum_coef2
         self.time = 1
 
+    @torch.no_grad()
     def _update_grads(self):
-        for idx, p in enumerate(self.params):
-            self.grad_accums1[idx] = self.momentum_coef1 * self.grad_accums1[idx] + (1 - self.momentum_coef1) * p.grad
-            self.grad_accums2[idx] = self.momentum_coef2 * self.grad_accums2[idx] + (1 - self.momentum_coef2) * p.grad**2
-            m_norm = self.grad_accums1[idx] / (1 - self.momentum_coef1 ** self.time)
-            p_norm = self.grad_accums2[idx] / (1 - self.momentum_coef2 ** self.time)
-            p.data -= self.learning_rate * m_norm / (p_norm ** 0.5 + EPSILON)
+        datas, grads, grad_accums1, grad_accums2 = self._with_grads(self.grad_accums1, self.grad_accums2)
+        torch._foreach_mul_(grad_accums1, self.momentum_coef1)
+        torch._foreach_add_(grad_accums1, torch._foreach_mul(grads, 1 - self.momentum_coef1))
+        torch._foreach_mul_(grad_accums2, self.momentum_coef2)
+        squared_grads = torch._foreach_mul(grads, grads)
+        torch._foreach_mul_(squared_grads, 1 - self.momentum_coef2)
+        torch._foreach_add_(grad_accums2, squared_grads)
+
+        updates = torch._foreach_div(grad_accums1, 1 - self.momentum_coef1 ** self.time)
+        torch._foreach_mul_(updates, self.learning_rate)
+        denoms = torch._foreach_div(grad_accums2, 1 - self.momentum_coef2 ** self.time)
+        torch._foreach_sqrt_(denoms)
+        torch._foreach_add_(denoms, EPSILON)
+        torch._foreach_div_(updates, denoms)
+        torch._foreach_sub_(datas, updates)
         self.time += 1
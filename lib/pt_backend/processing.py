@@ -1,45 +1,21 @@
-from lib.pt_backend.linear_algebra import Matrix
-
+import numpy as np
 
-class OneHotEncoder:
-    def __init__(self):
-        self.categories = []
+from lib import processing
+from lib.pt_backend.linear_algebra import Matrix
 
-    def fit(self, vector):
-        for v in vector:
-            if v not in self.categories:
-                self.categories.append(v)
 
+class OneHotEncoder(processing.OneHotEncoder):
     def transform(self, vector):
-        result = []
-        for v in vector:
-            result.append([int(v == c) for c in self.categories])
+        return Matrix.from_array(self.transform_array(vector).astype(np.float32))
 
-        return Matrix(result)
 
+class ColumnNormalizer(processing.ColumnNormalizer):
+    DDOF = 1  # torch.std is Bessel corrected
 
-class ColumnNormalizer:
-    def __init__(self):
-        self.means = []
-        self.stds = []
-
-    def fit(self, matrix):     
-        for col in range(matrix.dims()[1]):
-            self.means.append(matrix.col(col).mean())
-            self.stds.append(matrix.col(col).std())
-            
     def transform(self, matrix):
-        return Matrix((matrix - Matrix(self.means)) / Matrix(self.stds))
-
-
-class LabelEncoder:
-    def __init__(self):
-        self.categories = []
+        return Matrix.from_array(self.transform_array(matrix).astype(np.float32))
 
-    def fit(self, vector):
-        for v in vector:
-            if v not in self.categories:
-                self.categories.append(v)
 
+class LabelEncoder(processing.LabelEncoder):
     def transform(self, vector):
-        return Matrix([self.categories.index(v) for v in vector])
+        return Matrix.from_array(self.transform_array(vector).astype(np.float32))
@@ -1,73 +1,372 @@
+import functools
+import heapq
+import itertools
+import os
+import re
 import time
-from collections import Counter
+from collections import Counter, defaultdict
+
+from lib.parallel import map_chunks
+
+
+_worker_tokenizer = None
+
+
+def _init_encode_worker(tokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _encode_chunk(docs):
+    return [_worker_tokenizer.encode(doc) for doc in docs]
+
+
+def _count_pretokens(docs):
+    return Counter(pretoken for doc in docs for pretoken in BPETokenizer.PRETOKEN_PATTERN.findall(doc)), len(docs)
+
+
+def _chunked(items, chunk_size):
+    items = iter(items)
+    return iter(lambda: list(itertools.islice(items, chunk_size)), [])
+
+
+def _read_lines(path):
+    with open(path, "rt") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+class _PairIndex:
+    """Doubly linked token sequence with adjacent pair counts, updated only around each merge."""
+
+    def __init__(self, tokens):
+        n = len(tokens)
+        self.tokens = tokens
+        self.prev = list(range(-1, n - 1))
+        self.next = list(range(1, n + 1))
+        if n:
+            self.next[-1] = -1
+        self.tail = n - 1
+        self.size = n
+
+        self.counts = Counter()
+        self.positions = defaultdict(list)
+        for idx in range(n - 1):
+            pair = tokens[idx] + tokens[idx + 1]
+            self.counts[pair] += 1
+            self.positions[pair].append(idx)
+        self.heap = [(-count, self.positions[pair][0], pair) for pair, count in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return self.size
+
+    def _is_at(self, pair, idx):
+        next_idx = self.next[idx]
+        return self.tokens[idx] is not None and next_idx != -1 and self.tokens[idx] + self.tokens[next_idx] == pair
+
+    def _first(self, pair):
+        positions = self.positions[pair]
+        while not self._is_at(pair, positions[0]):
+            heapq.heappop(positions)
+        return positions[0]
+
+    def _add(self, idx, touched):
+        pair = self.tokens[idx] + self.tokens[self.next[idx]]
+        self.counts[pair] += 1
+        heapq.heappush(self.positions[pair], idx)
+        touched.add(pair)
+
+    def _remove(self, idx, touched):
+        pair = self.tokens[idx] + self.tokens[self.next[idx]]
+        self.counts[pair] -= 1
+        if self.counts[pair] == 0:
+            del self.counts[pair]
+            del self.positions[pair]
+        touched.add(pair)
+
+    def most_common(self):
+        while self.heap:
+            neg_count, first, pair = self.heap[0]
+            if self.counts.get(pair) == -neg_count and self._first(pair) == first:
+                return pair
+            heapq.heappop(self.heap)
+        return None
+
+    def merge(self, pair):
+        touched = set()
+        tail_merged = False
+        for idx in sorted(set(self.positions[pair])):
+            # occurrences overlapping an earlier merge of this pass are skipped, like in a left to right scan
+            if not self._is_at(pair, idx):
+                continue
+            prev_idx, next_idx = self.prev[idx], self.next[idx]
+            next_next_idx = self.next[next_idx]
+            if prev_idx != -1:
+                self._remove(prev_idx, touched)
+            if next_next_idx != -1:
+                self._remove(next_idx, touched)
+            self._remove(idx, touched)
+
+            self.tokens[idx], self.tokens[next_idx] = pair, None
+            self.next[idx] = next_next_idx
+            if next_next_idx != -1:
+                self.prev[next_next_idx] = idx
+                self._add(idx, touched)
+            else:
+                self.tail = idx
+                tail_merged = True
+            if prev_idx != -1:
+                self._add(prev_idx, touched)
+            self.size -= 1
+
+        # the original merge pass never copied the last token unless it was merged into its left neighbour
+        if not tail_merged and self.size:
+            tail = self.tail
+            self.tail = self.prev[tail]
+            if self.tail != -1:
+                self._remove(self.tail, touched)
+                self.next[self.tail] = -1
+            self.tokens[tail] = None
+            self.size -= 1
+
+        for touched_pair in touched:
+            if touched_pair in self.counts:
+                heapq.heappush(self.heap, (-self.counts[touched_pair], self._first(touched_pair), touched_pair))
+
+
+class _WordPairIndex:
+    """Adjacent pair counts over unique pre-tokens, weighted by how often each pre-token occurs."""
+
+    def __init__(self, word_counts):
+        self.words = [list(word) for word in word_counts]
+        self.freqs = list(word_counts.values())
+        self.size = sum(len(word) * freq for word, freq in zip(self.words, self.freqs))
+
+        self.counts = Counter()
+        self.word_indices = defaultdict(set)
+        for word_idx, (word, freq) in enumerate(zip(self.words, self.freqs)):
+            for t1, t2 in zip(word, word[1:]):
+                self.counts[t1 + t2] += freq
+                self.word_indices[t1 + t2].add(word_idx)
+        self.heap = [(-count, pair) for pair, count in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return self.size
+
+    def most_common(self):
+        while self.heap:
+            neg_count, pair = self.heap[0]
+            if self.counts.get(pair) == -neg_count:
+                return pair
+            heapq.heappop(self.heap)
+        return None
+
+    def merge(self, pair):
+        touched = set()
+        for word_idx in self.word_indices.pop(pair):
+            word, freq = self.words[word_idx], self.freqs[word_idx]
+            old_pairs = [t1 + t2 for t1, t2 in zip(word, word[1:])]
+
+            idx = 0
+            new_word = []
+            while idx < len(word):
+                if idx < len(word) - 1 and word[idx] + word[idx + 1] == pair:
+                    new_word.append(pair)
+                    idx += 2
+                else:
+                    new_word.append(word[idx])
+                    idx += 1
+            new_pairs = [t1 + t2 for t1, t2 in zip(new_word, new_word[1:])]
+
+            for old_pair in old_pairs:
+                self.counts[old_pair] -= freq
+            for new_pair in new_pairs:
+                self.counts[new_pair] += freq
+                self.word_indices[new_pair].add(word_idx)
+            for old_pair in set(old_pairs).difference(new_pairs):
+                self.word_indices[old_pair].discard(word_idx)
+            touched.update(old_pairs, new_pairs)
+            self.words[word_idx] = new_word
+            self.size -= (len(word) - len(new_word)) * freq
+
+        for touched_pair in touched:
+            count = self.counts.get(touched_pair, 0)
+            if count > 0:
+                heapq.heappush(self.heap, (-count, touched_pair))
+            else:
+                self.counts.pop(touched_pair, None)
+                self.word_indices.pop(touched_pair, None)
 
 
 class BPETokenizer:
     SEPARATOR_TOKEN = "<SEPARATOR>"
+    PRETOKEN_PATTERN = re.compile(r" ?\w+| ?[^\w\s]+|\s+(?!\S)|\s+")
+    # text trained vocabs hold tokens spanning words and their trailing spaces, so they are encoded per such chunk
+    TEXT_CHUNK_PATTERN = re.compile(r"\S+\s*|\s+")
+    ENCODE_CACHE_SIZE = 2 ** 16
 
-    def __init__(self, max_vocab=1000, enable_logs=True):
+    def __init__(self, max_vocab=1000, enable_logs=True, pretokenize=False):
         self.vocab = None
         self.max_vocab = max_vocab
         self.enable_logs = enable_logs
+        self.pretokenize = pretokenize
+
+    @property
+    def vocab(self):
+        return self._vocab
+
+    @vocab.setter
+    def vocab(self, vocab):
+        self._vocab = vocab
+        self._reset_encoder()
+
+    def _reset_encoder(self):
+        self._token_ids = None
+        self._merges = None
+        self._encode_pretoken = functools.lru_cache(maxsize=self.ENCODE_CACHE_SIZE)(self._merge_pretoken)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_encode_pretoken"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._encode_pretoken = functools.lru_cache(maxsize=self.ENCODE_CACHE_SIZE)(self._merge_pretoken)
+
+    @property
+    def merges(self):
+        """Maps a (left, right) token index pair to the index of their concatenation, which is also its rank."""
+        if self._merges is None:
+            self._token_ids = self._get_token_ids()
+            self._merges = {}
+            for idx, token in enumerate(self.vocab):
+                if idx == 0 or len(token) < 2 or self._token_ids[token] != idx:
+                    continue
+                for split_idx in range(1, len(token)):
+                    left_idx = self._token_ids.get(token[:split_idx])
+                    right_idx = self._token_ids.get(token[split_idx:])
+                    if left_idx is not None and right_idx is not None:
+                        self._merges[(left_idx, right_idx)] = idx
+        return self._merges
+
+    @merges.setter
+    def merges(self, merges):
+        self._reset_encoder()
+        self._token_ids = self._get_token_ids()
+        self._merges = merges
+
+    def _get_token_ids(self):
+        token_ids = {}
+        for idx, token in enumerate(self.vocab):
+            token_ids.setdefault(token, idx)
+        return token_ids
 
-    def _log_step(self, i, tokenized_text, elapsed_time):
+    def _log_step(self, i, tokenized_text, elapsed_time, docs_per_s=None):
         if self.enable_logs:
+            if docs_per_s is not None:
+                print(f"{i} docs counted; {len(tokenized_text)} unique pre-tokens; {docs_per_s:.0f} docs/s; {elapsed_time}s")
+                return
             print(f"{i}; last token '{self.vocab[-1]}'; |text|={len(tokenized_text)} tokens; |vocab|={len(self.vocab)} tokens; {elapsed_time}s")
 
-    def fit(self, docs):        
+    def _fit_words(self, docs, workers, chunk_size):
+        chunks = _chunked(docs, chunk_size)
+        chunk_counts = map(_count_pretokens, chunks) if workers == 1 else map_chunks(_count_pretokens, chunks, workers)
+        pretoken_counts = Counter()
+        docs_count = 0
+        start_time_point = time.time()
+        for counts, chunk_docs_count in chunk_counts:
+            pretoken_counts.update(counts)
+            docs_count += chunk_docs_count
+            elapsed_time = time.time() - start_time_point
+            self._log_step(docs_count, pretoken_counts, int(elapsed_time), docs_count / max(elapsed_time, 1e-9))
+        self.vocab = [self.SEPARATOR_TOKEN] + list(sorted(set("".join(pretoken_counts))))
+        char_indices = {char: idx for idx, char in enumerate(self.vocab) if idx > 0}
+        return _WordPairIndex({
+            tuple((char_indices[char], ) for char in pretoken): count for pretoken, count in pretoken_counts.items()
+        })
+
+    def _fit_text(self, docs):
         text = f" {self.SEPARATOR_TOKEN} ".join([d for d in docs])
         self.vocab = [self.SEPARATOR_TOKEN] + list(sorted(set(text)))
-        tokenized_text = [(t, ) for t in self.encode(text)]
-        
+        char_indices = {char: idx for idx, char in enumerate(self.vocab) if idx > 0}
+        tokenized_text = []
+        for doc_idx, doc in enumerate(text.split(self.SEPARATOR_TOKEN)):
+            if doc_idx > 0:
+                tokenized_text.append((0, ))
+            tokenized_text.extend((char_indices[char], ) for char in doc)
+        return _PairIndex(tokenized_text)
+
+    def fit(self, docs, workers=1, chunk_size=10000):
+        """Trains the vocab on an iterable of docs or on a text file path with one doc per line."""
+        if isinstance(docs, (str, os.PathLike)):
+            docs = _read_lines(docs)
+        pairs = self._fit_words(docs, workers, chunk_size) if self.pretokenize else self._fit_text(docs)
+
         i = 0
         time_point = time.time()
         elapsed_time = int(time.time() - time_point)
-        self._log_step(i, tokenized_text, elapsed_time)
+        self._log_step(i, pairs, elapsed_time)
         time_point = time.time()
 
         while len(self.vocab) < self.max_vocab:
-            c = Counter()
-            for t1, t2 in zip(tokenized_text, tokenized_text[1:]):
-                c[t1 + t2] += 1
-            new_enc_token, new_enc_token_count  = c.most_common(1)[0]
+            new_enc_token = pairs.most_common()
+            if new_enc_token is None:
+                break
             self.vocab.append("".join(self.vocab[i] for i in new_enc_token))
-
-            idx = 0
-            new_tokenized_text = []
-            while idx < len(tokenized_text) - 1:
-                if (tokenized_text[idx] + tokenized_text[idx+1]) == new_enc_token:
-                    new_tokenized_text.append(new_enc_token)
-                    idx += 2
-                else:
-                    new_tokenized_text.append(tokenized_text[idx])
-                    idx += 1
-            tokenized_text = new_tokenized_text
+            pairs.merge(new_enc_token)
 
             i += 1
             elapsed_time = int(time.time() - time_point)
-            self._log_step(i, tokenized_text, elapsed_time)
+            self._log_step(i, pairs, elapsed_time)
             time_point = time.time()
 
     def decode(self, tokens):
         return "".join(self.vocab[idx] for idx in tokens) 
 
+    def _merge_pretoken(self, pretoken):
+        merges = self.merges
+        # characters missing from the vocab are kept as they are
+        tokens = [self._token_ids.get(char, char) for char in pretoken]
+        while len(tokens) > 1:
+            rank = min(merges.get(pair, len(self.vocab)) for pair in zip(tokens, tokens[1:]))
+            if rank == len(self.vocab):
+                break
+            idx = 0
+            new_tokens = []
+            while idx < len(tokens):
+                if idx < len(tokens) - 1 and merges.get((tokens[idx], tokens[idx + 1])) == rank:
+                    new_tokens.append(rank)
+                    idx += 2
+                else:
+                    new_tokens.append(tokens[idx])
+                    idx += 1
+            tokens = new_tokens
+        return tuple(tokens)
+
     def encode(self, text):
-        tokenized_text = list(text)
-
-        indexed_tokens = [(0, self.SEPARATOR_TOKEN)]        
-        for reverse_idx, token in enumerate(reversed(self.vocab[1:])):
-            idx = len(self.vocab) - reverse_idx - 1
-            indexed_tokens.append((idx, token))
-
-        for idx, token in indexed_tokens:
-            start_idx = 0
-            while True:
-                start_idx = text.find(token, start_idx)
-                if start_idx == -1:
-                    break
-                end_idx = start_idx + len(token)
-                if all(isinstance(tt, str) for tt in tokenized_text[start_idx:end_idx]):
-                    tokenized_text[start_idx] = idx
-                    tokenized_text[start_idx+1:end_idx] = [-1] * (end_idx - start_idx - 1)
-                start_idx = end_idx
-        return [t for t in tokenized_text if t != -1]
+        """Splits text into pre-tokens and applies the lowest rank merge within each one until none is left."""
+        pattern = self.PRETOKEN_PATTERN if self.pretokenize else self.TEXT_CHUNK_PATTERN
+        tokens = []
+        for doc_idx, doc in enumerate(text.split(self.SEPARATOR_TOKEN)):
+            if doc_idx > 0:
+                tokens.append(0)
+            for pretoken in pattern.findall(doc):
+                tokens.extend(self._encode_pretoken(pretoken))
+        return tokens
+
+    def encode_stream(self, docs, workers=None, chunk_size=256):
+        """Lazily encodes an iterable of docs in order, sharding chunks of docs across worker processes."""
+        workers = workers or os.cpu_count()
+        if workers == 1:
+            yield from map(self.encode, docs)
+            return
+
+        self.merges  # built here so workers receive it instead of rebuilding it
+        for encoded_chunk in map_chunks(_encode_chunk, _chunked(docs, chunk_size), workers, _init_encode_worker, (self, )):
+            yield from encoded_chunk
+
+    def encode_batch(self, docs, workers=None, chunk_size=256):
+        return list(self.encode_stream(docs, workers, chunk_size))
@@ -0,0 +1,21 @@
+import importlib
+
+import pytest
+
+
+@pytest.mark.parametrize("backend", ["np_backend", "original_backend"])
+@pytest.mark.parametrize("tape", [False, True])
+def test_backward_of_two_losses(backend, tape):
+    Value = importlib.import_module(f"lib.{backend}.value").Value
+    Value.use_tape(tape)
+    try:
+        a = Value(2.)
+        l1 = a * a
+        l2 = a * Value(3.)
+        l1.grad = 1
+        l1.backward()
+        l2.grad = 1
+        l2.backward()
+        assert a.grad == 7
+    finally:
+        Value.use_tape(False)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from lib.processing import LabelEncoder, OneHotEncoder
+
+
+@pytest.mark.parametrize("fit_values, values", [
+    ([True, False, True], [False, True, True]),
+    ([3, 1, 3, 7], [7, 1, 3, 3]),
+    ([0.5, 2.0, 0.5], [2.0, 0.5]),
+    (["b", "a", "b", "c"], ["c", "a", "b"]),
+])
+def test_array_codes_match_list_codes(fit_values, values):
+    for encoder_type in (LabelEncoder, OneHotEncoder):
+        list_encoder, array_encoder = encoder_type(), encoder_type()
+        list_encoder.fit(fit_values)
+        array_encoder.fit(np.array(fit_values))
+        assert array_encoder.categories == list_encoder.categories == list(dict.fromkeys(fit_values))
+        np.testing.assert_array_equal(array_encoder.transform_array(np.array(values)), list_encoder.transform_array(values))
+
+
+@pytest.mark.parametrize("fit_values, unseen", [
+    ([True, True], [False]),
+    ([3, 1], [2, 100]),
+    ([0.5, 2.0], [1.0]),
+    (["b", "a"], ["c"]),
+])
+def test_unseen_values(fit_values, unseen):
+    encoder = OneHotEncoder()
+    encoder.fit(np.array(fit_values))
+    np.testing.assert_array_equal(encoder.codes(np.array(unseen)), [-1] * len(unseen))
+    label_encoder = LabelEncoder()
+    label_encoder.fit(np.array(fit_values))
+    with pytest.raises(ValueError):
+        label_encoder.transform_array(np.array(unseen))
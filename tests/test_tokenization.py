@@ -0,0 +1,26 @@
+import pytest
+
+from lib.tokenization import BPETokenizer
+
+SPECIAL_CHARS = ['<SEPARATOR>', ' ', '<', '>', 'A', 'E', 'O', 'P', 'R', 'S', 'T']
+
+
+# expected vocabs were produced by the original full recount trainer
+@pytest.mark.parametrize("docs, max_vocab, expected_tokens", [
+    (["abab ab", "aab ba", "abba"], 18,
+     ['a', 'b', 'ab', 'ab ', '<SEPARATOR> ', 'abab ', 'abab ab ']),
+    (["low lower lowest", "newer newest wider", "low low"], 30,
+     ['d', 'e', 'i', 'l', 'n', 'o', 'r', 's', 't', 'w', 'lo', 'low', ' low', 'er', 'es', 'est', 'est ', ' n', ' ne']),
+])
+def test_text_fit_vocab(docs, max_vocab, expected_tokens):
+    tokenizer = BPETokenizer(max_vocab=max_vocab, enable_logs=False)
+    tokenizer.fit(docs)
+    assert tokenizer.vocab == SPECIAL_CHARS + expected_tokens
+
+
+def test_merges_setter_resets_encode_cache():
+    tokenizer = BPETokenizer(max_vocab=14, enable_logs=False)
+    tokenizer.fit(["abab ab", "aab ba", "abba"])
+    assert tokenizer.encode("abab") == [13, 13]
+    tokenizer.merges = {}
+    assert tokenizer.encode("abab") == [11, 12, 11, 12]